@@ -1,27 +1,59 @@
 from django.contrib import admin
+from django.db import transaction
 from django.http import HttpResponseRedirect
 from django.shortcuts import reverse
 from django.templatetags.static import static
+from django.utils import timezone
 from django.utils.html import format_html
 
+from .dispatch import dispatch_orders
 from .models import Product
 from .models import ProductCategory
 from .models import Restaurant
 from .models import RestaurantMenuItem
 from .models import Order
 from .models import OrderItem
+from .models import prepare_orders_in_background
 from geocoding.models import Location
+from geocoding.normalization import normalize_address
+from geocoding.utils import location_lru
 
 
-class RestaurantMenuItemInline(admin.TabularInline):
+class CachedChoicesInline(admin.TabularInline):
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(
+            db_field,
+            request,
+            **kwargs
+        )
+        # every inline row would otherwise query the choices again
+        cache_attr = f'_cached_{self.model._meta.model_name}_{db_field.name}'
+        choices = getattr(request, cache_attr, None)
+        if choices is None:
+            choices = list(formfield.choices)
+            setattr(request, cache_attr, choices)
+        formfield.choices = choices
+        return formfield
+
+
+class RestaurantMenuItemInline(CachedChoicesInline):
     model = RestaurantMenuItem
     extra = 0
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'restaurant',
+            'product'
+        )
 
-class OrderItemInline(admin.TabularInline):
+
+class OrderItemInline(CachedChoicesInline):
     model = OrderItem
     extra = 0
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+
 
 @admin.register(Restaurant)
 class RestaurantAdmin(admin.ModelAdmin):
@@ -34,6 +66,9 @@ class RestaurantAdmin(admin.ModelAdmin):
         'name',
         'address',
         'contact_phone',
+        'lat',
+        'lon',
+        'max_active_orders',
     ]
     inlines = [
         RestaurantMenuItemInline
@@ -51,6 +86,9 @@ class ProductAdmin(admin.ModelAdmin):
     list_display_links = [
         'name',
     ]
+    list_select_related = [
+        'category',
+    ]
     list_filter = [
         'category',
     ]
@@ -146,21 +184,41 @@ class OrderAdmin(admin.ModelAdmin):
     )
     readonly_fields = ['created_at']
     actions = [
+        'dispatch_to_restaurants',
         'mark_restaurant_confirmed',
         'mark_delivery_started',
         'mark_completed'
     ]
 
+    def dispatch_to_restaurants(self, request, queryset):
+        result = dispatch_orders(queryset)
+        self.message_user(
+            request,
+            f'Распределено заказов: {result["assigned"]} '
+            f'из {result["orders"]} необработанных, '
+            f'время расчёта: {result["solve_seconds"] * 1000:.1f} мс'
+        )
+    dispatch_to_restaurants.short_description = 'Распределить по ресторанам'
+
     def mark_restaurant_confirmed(self, request, queryset):
-        queryset.update(status=Order.Status.RESTAURANT_CONFIRMED)
+        queryset.update(
+            status=Order.Status.RESTAURANT_CONFIRMED,
+            changed_at=timezone.now(),
+        )
     mark_restaurant_confirmed.short_description = 'Отметить: Ресторан подтвердил'
 
     def mark_delivery_started(self, request, queryset):
-        queryset.update(status=Order.Status.DELIVERY_STARTED)
+        queryset.update(
+            status=Order.Status.DELIVERY_STARTED,
+            changed_at=timezone.now(),
+        )
     mark_delivery_started.short_description = 'Отметить: Передан курьеру'
 
     def mark_completed(self, request, queryset):
-        queryset.update(status=Order.Status.COMPLETED)
+        queryset.update(
+            status=Order.Status.COMPLETED,
+            changed_at=timezone.now(),
+        )
     mark_completed.short_description = 'Отметить: Заказ выполнен'
 
     list_display_links = [
@@ -170,6 +228,15 @@ class OrderAdmin(admin.ModelAdmin):
         OrderItemInline
     ]
 
+    def save_model(self, request, obj, form, change):
+        if 'address' in form.changed_data:
+            obj.location = None
+        super().save_model(request, obj, form, change)
+        if obj.location_id is None:
+            transaction.on_commit(
+                lambda: prepare_orders_in_background([obj.id])
+            )
+
     def response_post_save_change(self, request, obj):
         if request.GET.get('_from_order_items') == '1':
             return HttpResponseRedirect(reverse('restaurateur:view_orders'))
@@ -182,7 +249,16 @@ class LocationAdmin(admin.ModelAdmin):
         'address',
         'lat',
         'lon',
+        'failed_attempts',
+        'retry_at',
         'created_at',
         'updated_at',
     ]
 
+    def save_model(self, request, obj, form, change):
+        if change and 'address' in form.changed_data:
+            location_lru.invalidate(
+                normalize_address(form.initial['address'])
+            )
+        super().save_model(request, obj, form, change)
+
@@ -0,0 +1,189 @@
+import gzip
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.renderers import JSONRenderer
+
+from geocoding.tasks import run_in_background
+
+from .models import Product, RestaurantMenuItem
+from .models import bump_catalog_version, get_catalog_version
+
+
+CATALOG_BLOB_KEY = 'foodcartapp:catalog_blob:{version}'
+
+PRODUCT_FIELDS = {
+    'id': ['id'],
+    'name': ['name'],
+    'price': ['price'],
+    'special_status': ['special_status'],
+    'description': ['description'],
+    'category': ['category_id', 'category__name'],
+    'image': ['image'],
+    'restaurants': [],
+}
+
+
+def dump_products():
+    menu_items = (
+        RestaurantMenuItem.objects
+        .filter(availability=True)
+        .select_related('product__category', 'restaurant')
+        .order_by('product_id', 'restaurant__name')
+    )
+
+    dumped_products = {}
+    for menu_item in menu_items:
+        product = menu_item.product
+        if product.id not in dumped_products:
+            dumped_products[product.id] = {
+                'id': product.id,
+                'name': product.name,
+                'price': product.price,
+                'special_status': product.special_status,
+                'description': product.description,
+                'category': {
+                    'id': product.category.id,
+                    'name': product.category.name,
+                } if product.category else None,
+                'image': product.image.url,
+                'restaurants': [],
+            }
+        dumped_products[product.id]['restaurants'].append({
+            'id': menu_item.restaurant.id,
+            'name': menu_item.restaurant.name,
+        })
+    return list(dumped_products.values())
+
+
+def encode_product_cursor(product_id):
+    return urlsafe_b64encode(str(product_id).encode()).decode()
+
+
+def decode_product_cursor(cursor):
+    try:
+        return int(urlsafe_b64decode(cursor.encode()).decode())
+    except ValueError:
+        return None
+
+
+def get_product_restaurants(product_ids):
+    menu_items = (
+        RestaurantMenuItem.objects
+        .filter(product_id__in=product_ids, availability=True)
+        .order_by('restaurant__name')
+        .values_list('product_id', 'restaurant_id', 'restaurant__name')
+    )
+    restaurants = {product_id: [] for product_id in product_ids}
+    for product_id, restaurant_id, restaurant_name in menu_items:
+        restaurants[product_id].append({
+            'id': restaurant_id,
+            'name': restaurant_name,
+        })
+    return restaurants
+
+
+def query_products(fields=None, category=None, special_status=None,
+                   restaurant=None, after=None, limit=None):
+    fields = fields or list(PRODUCT_FIELDS)
+    products = Product.objects.available().order_by('id')
+    if category is not None:
+        products = products.filter(category_id=category)
+    if special_status is not None:
+        products = products.filter(special_status=special_status)
+    if restaurant is not None:
+        products = products.filter(
+            menu_items__restaurant_id=restaurant,
+            menu_items__availability=True,
+        )
+    if after is not None:
+        products = products.filter(id__gt=after)
+
+    db_fields = {'id'}
+    for field in fields:
+        db_fields.update(PRODUCT_FIELDS[field])
+    products = products.values(*db_fields)
+    if limit is not None:
+        products = products[:limit + 1]
+    products = list(products)
+
+    next_after = None
+    if limit is not None and len(products) > limit:
+        products = products[:limit]
+        next_after = products[-1]['id']
+
+    restaurants = {}
+    if 'restaurants' in fields:
+        restaurants = get_product_restaurants(
+            [product['id'] for product in products]
+        )
+
+    image_storage = Product._meta.get_field('image').storage
+    dumped_products = []
+    for product in products:
+        dumped_product = {}
+        for field in fields:
+            if field == 'category':
+                dumped_product['category'] = {
+                    'id': product['category_id'],
+                    'name': product['category__name'],
+                } if product['category_id'] else None
+            elif field == 'image':
+                dumped_product['image'] = image_storage.url(product['image'])
+            elif field == 'restaurants':
+                dumped_product['restaurants'] = restaurants[product['id']]
+            else:
+                dumped_product[field] = product[field]
+        dumped_products.append(dumped_product)
+    return dumped_products, next_after
+
+
+def materialize_catalog(version):
+    body = JSONRenderer().render(dump_products())
+    blob = {
+        'body': body,
+        'gzip': gzip.compress(body, mtime=0),
+    }
+    cache = caches[settings.CATALOG_CACHE]
+    cache.set(
+        CATALOG_BLOB_KEY.format(version=version),
+        blob,
+        settings.CATALOG_CACHE_TTL
+    )
+    return blob
+
+
+def get_catalog_blob(version):
+    cache = caches[settings.CATALOG_CACHE]
+    blob = cache.get(CATALOG_BLOB_KEY.format(version=version))
+    if blob is None:
+        blob = materialize_catalog(version)
+    return blob
+
+
+def materialize_current_catalog():
+    version, _ = get_catalog_version()
+    materialize_catalog(version)
+
+
+def refresh_catalog():
+    bump_catalog_version()
+    run_in_background(materialize_current_catalog, key='materialize_catalog')
+
+
+def is_gzip_accepted(request):
+    qualities = {}
+    accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    for coding in accept_encoding.split(','):
+        name, _, params = coding.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip().lower()] = quality
+    return qualities.get('gzip', qualities.get('*', 0.0)) > 0
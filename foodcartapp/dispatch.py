@@ -0,0 +1,198 @@
+import time
+from heapq import heappop, heappush
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Order, OrderCandidate, Restaurant
+
+
+UNKNOWN_DISTANCE_COST = 10 ** 9
+
+
+class MinCostFlow:
+    def __init__(self, nodes_count):
+        self.graph = [[] for _ in range(nodes_count)]
+
+    def add_edge(self, source, target, capacity, cost):
+        self.graph[source].append(
+            [target, capacity, cost, len(self.graph[target])]
+        )
+        self.graph[target].append(
+            [source, 0, -cost, len(self.graph[source]) - 1]
+        )
+
+    def solve(self, source, sink):
+        nodes_count = len(self.graph)
+        potentials = [0] * nodes_count
+        total_cost = 0
+
+        while True:
+            distances = [None] * nodes_count
+            previous = [None] * nodes_count
+            distances[source] = 0
+            queue = [(0, source)]
+            while queue:
+                distance, node = heappop(queue)
+                if distance > distances[node]:
+                    continue
+                for edge_index, edge in enumerate(self.graph[node]):
+                    target, capacity, cost, _ = edge
+                    if not capacity:
+                        continue
+                    new_distance = (
+                        distance + cost
+                        + potentials[node] - potentials[target]
+                    )
+                    if (
+                        distances[target] is None
+                        or new_distance < distances[target]
+                    ):
+                        distances[target] = new_distance
+                        previous[target] = (node, edge_index)
+                        heappush(queue, (new_distance, target))
+
+            if distances[sink] is None:
+                return total_cost
+
+            for node in range(nodes_count):
+                if distances[node] is not None:
+                    potentials[node] += distances[node]
+
+            node = sink
+            while node != source:
+                previous_node, edge_index = previous[node]
+                edge = self.graph[previous_node][edge_index]
+                edge[1] -= 1
+                self.graph[node][edge[3]][1] += 1
+                total_cost += edge[2]
+                node = previous_node
+
+
+def solve_assignment(candidates_by_order_id, capacities):
+    order_ids = list(candidates_by_order_id)
+    restaurant_ids = [
+        restaurant_id for restaurant_id, capacity in capacities.items()
+        if capacity > 0
+    ]
+    order_nodes = {
+        order_id: index + 1 for index, order_id in enumerate(order_ids)
+    }
+    restaurant_nodes = {
+        restaurant_id: len(order_ids) + index + 1
+        for index, restaurant_id in enumerate(restaurant_ids)
+    }
+    source, sink = 0, len(order_ids) + len(restaurant_ids) + 1
+
+    flow = MinCostFlow(sink + 1)
+    for order_id, candidates in candidates_by_order_id.items():
+        flow.add_edge(source, order_nodes[order_id], 1, 0)
+        for restaurant_id, distance_km in candidates:
+            if restaurant_id not in restaurant_nodes:
+                continue
+            cost = (
+                UNKNOWN_DISTANCE_COST
+                if distance_km is None
+                else round(distance_km * 1000)
+            )
+            flow.add_edge(
+                order_nodes[order_id],
+                restaurant_nodes[restaurant_id],
+                1,
+                cost,
+            )
+    for restaurant_id in restaurant_ids:
+        flow.add_edge(
+            restaurant_nodes[restaurant_id],
+            sink,
+            capacities[restaurant_id],
+            0,
+        )
+
+    flow.solve(source, sink)
+
+    restaurant_ids_by_node = {
+        node: restaurant_id
+        for restaurant_id, node in restaurant_nodes.items()
+    }
+    assignment = {}
+    for order_id in order_ids:
+        for target, capacity, _, _ in flow.graph[order_nodes[order_id]]:
+            if target in restaurant_ids_by_node and not capacity:
+                assignment[order_id] = restaurant_ids_by_node[target]
+    return assignment
+
+
+def get_free_capacities(lock=False):
+    restaurants = Restaurant.objects.order_by('id')
+    if lock:
+        restaurants = restaurants.select_for_update()
+    capacities = dict(restaurants.values_list('id', 'max_active_orders'))
+
+    busy_counts = {
+        restaurant_id: count
+        for restaurant_id, count in (
+            Order.objects
+            .active()
+            .filter(restaurant__isnull=False)
+            .values_list('restaurant')
+            .annotate(count=Count('id'))
+        )
+    }
+    return {
+        restaurant_id: max(capacity - busy_counts.get(restaurant_id, 0), 0)
+        for restaurant_id, capacity in capacities.items()
+    }
+
+
+def dispatch_orders(orders=None, dry_run=False):
+    if orders is None:
+        orders = Order.objects.all()
+
+    with transaction.atomic():
+        # restaurants are locked first so concurrent runs queue up here
+        # and count busy orders only after the previous run has committed
+        capacities = get_free_capacities(lock=True)
+        orders = list(
+            Order.objects
+            .filter(pk__in=orders.values('pk'))
+            .filter(status=Order.Status.UNPROCESSED, restaurant__isnull=True)
+            .select_for_update()
+            .only('id', 'status', 'restaurant')
+        )
+
+        candidates_by_order_id = {order.id: [] for order in orders}
+        for order_id, restaurant_id, distance_km in (
+            OrderCandidate.objects
+            .filter(order_id__in=candidates_by_order_id)
+            .values_list('order_id', 'restaurant_id', 'distance_km')
+        ):
+            candidates_by_order_id[order_id].append(
+                (restaurant_id, distance_km)
+            )
+
+        started_at = time.perf_counter()
+        assignment = solve_assignment(candidates_by_order_id, capacities)
+        solve_seconds = time.perf_counter() - started_at
+
+        now = timezone.now()
+        assigned_orders = []
+        for order in orders:
+            if order.id in assignment:
+                order.restaurant_id = assignment[order.id]
+                order.status = Order.Status.RESTAURANT_CONFIRMED
+                order.changed_at = now
+                assigned_orders.append(order)
+
+        if not dry_run:
+            Order.objects.bulk_update(
+                assigned_orders,
+                ['restaurant', 'status', 'changed_at']
+            )
+
+    return {
+        'orders': len(orders),
+        'assigned': len(assigned_orders),
+        'solve_seconds': solve_seconds,
+    }
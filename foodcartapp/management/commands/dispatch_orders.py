@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.dispatch import dispatch_orders
+
+
+class Command(BaseCommand):
+    help = 'Распределяет необработанные заказы по ближайшим ресторанам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Посчитать распределение, но не сохранять его',
+        )
+
+    def handle(self, *args, **options):
+        result = dispatch_orders(dry_run=options['dry_run'])
+        self.stdout.write(
+            f'Заказов: {result["orders"]}, '
+            f'распределено: {result["assigned"]}, '
+            f'время расчёта: {result["solve_seconds"] * 1000:.1f} мс'
+        )
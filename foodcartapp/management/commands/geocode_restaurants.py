@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from foodcartapp.models import Restaurant, bump_menu_version
+from foodcartapp.models import forget_restaurant_distances
+from geocoding.utils import get_or_create_locations
+
+
+class Command(BaseCommand):
+    help = 'Заполняет координаты ресторанов по их адресам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересчитать координаты всех ресторанов, а не только пустые',
+        )
+
+    def handle(self, *args, **options):
+        restaurants = Restaurant.objects.exclude(address='')
+        if not options['all']:
+            restaurants = restaurants.filter(lat__isnull=True)
+        restaurants = list(restaurants)
+
+        coordinates = get_or_create_locations(
+            [restaurant.address for restaurant in restaurants]
+        )
+        geocoded = []
+        for restaurant in restaurants:
+            coords = coordinates.get(restaurant.address)
+            if coords is None:
+                # the geocoder is unavailable, keep the known coordinates
+                continue
+            if coords == 'NOT_FOUND':
+                restaurant.lat, restaurant.lon = None, None
+            else:
+                restaurant.lat, restaurant.lon = coords
+            geocoded.append(restaurant)
+
+        moved_ids = [
+            restaurant.pk for restaurant in geocoded if restaurant.is_moved
+        ]
+        with transaction.atomic():
+            Restaurant.objects.bulk_update(geocoded, ['lat', 'lon'])
+            if moved_ids:
+                forget_restaurant_distances(moved_ids)
+        bump_menu_version()
+
+        found = sum(1 for restaurant in geocoded if restaurant.coordinates)
+        skipped = len(restaurants) - len(geocoded)
+        self.stdout.write(
+            f'Обработано ресторанов: {len(geocoded)}, найдено: {found}, '
+            f'пропущено из-за недоступности геокодера: {skipped}'
+        )
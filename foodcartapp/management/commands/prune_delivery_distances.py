@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.models import DeliveryDistance
+
+
+class Command(BaseCommand):
+    help = 'Удаляет расстояния до адресов, которые давно не встречались'
+
+    def handle(self, *args, **options):
+        deleted, _ = DeliveryDistance.objects.stale().delete()
+        self.stdout.write(f'Удалено расстояний: {deleted}')
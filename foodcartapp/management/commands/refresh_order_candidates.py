@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рестораны, которые могут приготовить заказы'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересчитать и выполненные заказы',
+        )
+
+    def handle(self, *args, **options):
+        orders = Order.objects.all()
+        if not options['all']:
+            orders = orders.active()
+        orders.attach_locations()
+        orders.refresh_candidates()
+        self.stdout.write(f'Обработано заказов: {orders.count()}')
@@ -0,0 +1,141 @@
+import time
+from heapq import heappop, heappush
+from math import asin, cos, dist, pi, radians, sin
+
+from geocoding.distances import EARTH_RADIUS_KM
+
+
+class RestaurantAvailabilityIndex:
+    def __init__(self, restaurant_products):
+        self.restaurant_ids = list(restaurant_products)
+        self.positions = {
+            restaurant_id: position
+            for position, restaurant_id in enumerate(self.restaurant_ids)
+        }
+        self.all_restaurants_mask = (1 << len(self.restaurant_ids)) - 1
+        self.product_masks = {}
+
+        for position, restaurant_id in enumerate(self.restaurant_ids):
+            bit = 1 << position
+            for product_id in restaurant_products[restaurant_id]:
+                self.product_masks[product_id] = (
+                    self.product_masks.get(product_id, 0) | bit
+                )
+
+    def get_mask(self, product_ids):
+        mask = self.all_restaurants_mask
+        for product_id in product_ids:
+            mask &= self.product_masks.get(product_id, 0)
+            if not mask:
+                break
+        return mask
+
+    def make_checker(self, product_ids):
+        mask = self.get_mask(product_ids)
+        return lambda restaurant_id: bool(
+            mask >> self.positions[restaurant_id] & 1
+        )
+
+    def find_restaurants(self, product_ids):
+        mask = self.get_mask(product_ids)
+        restaurant_ids = []
+        while mask:
+            lowest_bit = mask & -mask
+            restaurant_ids.append(
+                self.restaurant_ids[lowest_bit.bit_length() - 1]
+            )
+            mask ^= lowest_bit
+        return restaurant_ids
+
+
+def to_unit_vector(lat, lon):
+    lat, lon = radians(lat), radians(lon)
+    return (cos(lat) * cos(lon), cos(lat) * sin(lon), sin(lat))
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * asin(min(chord / 2, 1))
+
+
+def km_to_chord(distance_km):
+    return 2 * sin(min(distance_km / (2 * EARTH_RADIUS_KM), pi / 2))
+
+
+class RestaurantSpatialIndex:
+    def __init__(self, restaurant_coords):
+        points = [
+            (to_unit_vector(*coords), restaurant_id)
+            for restaurant_id, coords in restaurant_coords.items()
+            if coords
+        ]
+        self.root = self.build(points, depth=0)
+
+    def build(self, points, depth):
+        if not points:
+            return None
+        axis = depth % 3
+        points.sort(key=lambda point: point[0][axis])
+        median = len(points) // 2
+        vector, restaurant_id = points[median]
+        return (
+            vector,
+            restaurant_id,
+            axis,
+            self.build(points[:median], depth + 1),
+            self.build(points[median + 1:], depth + 1),
+        )
+
+    def find_nearest(self, coords, limit=None, max_km=None, accept=None):
+        if limit == 0:
+            return []
+        target = to_unit_vector(*coords)
+        max_chord = km_to_chord(max_km) if max_km is not None else 2
+        nearest = []
+
+        def get_bound():
+            if limit is not None and len(nearest) >= limit:
+                return -nearest[0][0]
+            return max_chord
+
+        def visit(node):
+            if node is None:
+                return
+            vector, restaurant_id, axis, left, right = node
+
+            chord = dist(vector, target)
+            is_accepted = accept is None or accept(restaurant_id)
+            if is_accepted and chord <= get_bound():
+                heappush(nearest, (-chord, restaurant_id))
+                if limit is not None and len(nearest) > limit:
+                    heappop(nearest)
+
+            offset = target[axis] - vector[axis]
+            near, far = (left, right) if offset < 0 else (right, left)
+            visit(near)
+            if abs(offset) <= get_bound():
+                visit(far)
+
+        visit(self.root)
+        return [
+            (chord_to_km(chord), restaurant_id)
+            for chord, restaurant_id in sorted(
+                (-negative_chord, restaurant_id)
+                for negative_chord, restaurant_id in nearest
+            )
+        ]
+
+
+class MenuSnapshot:
+    def __init__(self, version, restaurant_products, restaurant_info):
+        self.version = version
+        self.created_at = time.monotonic()
+        self.restaurant_info = restaurant_info
+        self.availability_index = RestaurantAvailabilityIndex(
+            restaurant_products
+        )
+
+    def is_fresh(self, version, ttl):
+        return (
+            self.version == version
+            and time.monotonic() - self.created_at < ttl
+        )
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0048_alter_order_called_at_alter_order_created_at_and_more'),
+        ('geocoding', '0003_location_retry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='location',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='geocoding.location', verbose_name='координаты адреса'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0050_restaurant_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='candidates_refreshed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='рестораны подобраны'),
+        ),
+        migrations.CreateModel(
+            name='OrderCandidate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distance_km', models.FloatField(blank=True, null=True, verbose_name='расстояние, км')),
+                ('rank', models.PositiveIntegerField(verbose_name='место в списке')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='candidates', to='foodcartapp.order', verbose_name='заказ')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_candidates', to='foodcartapp.restaurant', verbose_name='ресторан')),
+            ],
+            options={
+                'verbose_name': 'подходящий ресторан',
+                'verbose_name_plural': 'подходящие рестораны',
+                'indexes': [models.Index(fields=['order', 'rank'], name='foodcartapp_order_i_7f08f5_idx')],
+                'unique_together': {('order', 'restaurant')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0051_ordercandidate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='max_active_orders',
+            field=models.PositiveIntegerField(default=10, help_text='Сколько заказов в работе ресторан может принять', verbose_name='заказов одновременно'),
+        ),
+    ]
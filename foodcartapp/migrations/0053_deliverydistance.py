@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0052_restaurant_max_active_orders'),
+        ('geocoding', '0003_location_retry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryDistance',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distance_km', models.FloatField(verbose_name='расстояние, км')),
+                ('last_used_at', models.DateTimeField(db_index=True, verbose_name='последнее использование')),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='delivery_distances', to='geocoding.location', verbose_name='адрес клиента')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='delivery_distances', to='foodcartapp.restaurant', verbose_name='ресторан')),
+            ],
+            options={
+                'verbose_name': 'расстояние доставки',
+                'verbose_name_plural': 'расстояния доставки',
+                'unique_together': {('location', 'restaurant')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+def clear_delivery_distances(apps, schema_editor):
+    # the precision of cached rows is unknown, they will be recalculated
+    DeliveryDistance = apps.get_model('foodcartapp', 'DeliveryDistance')
+    DeliveryDistance.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0054_order_changed_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            clear_delivery_distances,
+            migrations.RunPython.noop
+        ),
+        migrations.AddField(
+            model_name='deliverydistance',
+            name='precision',
+            field=models.CharField(default='fast', max_length=10, verbose_name='точность расчёта'),
+            preserve_default=False,
+        ),
+        migrations.AlterUniqueTogether(
+            name='deliverydistance',
+            unique_together={('location', 'restaurant', 'precision')},
+        ),
+    ]
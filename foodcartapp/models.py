@@ -1,12 +1,24 @@
 from collections import defaultdict
-from django.db import models
-from django.db.models import Sum, F, DecimalField
+from datetime import timedelta
+from math import isnan
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import models, transaction
+from django.db.models import Sum, F, DecimalField, Prefetch
+from django.utils import timezone
 from django.core.validators import MinValueValidator
-from geopy.distance import geodesic
 from phonenumber_field.modelfields import PhoneNumberField
 
+from geocoding.distances import distance_matrix
+from geocoding.models import Location
+from geocoding.normalization import normalize_address
+from geocoding.tasks import run_in_background
 from geocoding.utils import get_or_create_locations
 
+from .matching import MenuSnapshot, RestaurantSpatialIndex
+
 
 class Restaurant(models.Model):
     name = models.CharField(
@@ -23,14 +35,67 @@ class Restaurant(models.Model):
         max_length=50,
         blank=True,
     )
+    lat = models.FloatField('широта', null=True, blank=True)
+    lon = models.FloatField('долгота', null=True, blank=True)
+    max_active_orders = models.PositiveIntegerField(
+        'заказов одновременно',
+        default=10,
+        help_text='Сколько заказов в работе ресторан может принять',
+    )
 
     class Meta:
         verbose_name = 'ресторан'
         verbose_name_plural = 'рестораны'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_address = instance.__dict__.get('address')
+        instance._loaded_coordinates = (
+            instance.__dict__.get('lat'),
+            instance.__dict__.get('lon'),
+        )
+        return instance
+
     def __str__(self):
         return self.name
 
+    @property
+    def is_moved(self):
+        return (
+            self.address != getattr(self, '_loaded_address', None)
+            or (self.lat, self.lon) != getattr(
+                self, '_loaded_coordinates', None
+            )
+        )
+
+    def save(self, *args, **kwargs):
+        address_changed = (
+            self.address != getattr(self, '_loaded_address', None)
+        )
+        if address_changed or self.coordinates is None:
+            self.geocode_address()
+        is_moved = self.is_moved and self.pk is not None
+        super().save(*args, **kwargs)
+        self._loaded_address = self.address
+        self._loaded_coordinates = (self.lat, self.lon)
+        if is_moved:
+            forget_restaurant_distances([self.pk])
+
+    def geocode_address(self):
+        self.lat, self.lon = None, None
+        if not self.address.strip():
+            return
+        coords = get_or_create_locations([self.address])[self.address]
+        if coords and coords != 'NOT_FOUND':
+            self.lat, self.lon = coords
+
+    @property
+    def coordinates(self):
+        if self.lat is not None and self.lon is not None:
+            return (self.lat, self.lon)
+        return None
+
 
 class ProductQuerySet(models.QuerySet):
     def available(self):
@@ -138,65 +203,159 @@ class OrderQuerySet(models.QuerySet):
             )
         )
 
-    def with_restaurants_and_distances(self):
-        restaurant_products, restaurant_info = self._get_restaurant_data()
+    def active(self):
+        return self.exclude(status=Order.Status.COMPLETED)
 
-        all_addresses = self._collect_addresses(restaurant_info)
+    def refresh_candidates(self):
+        orders = (
+            self.select_related('location')
+            .prefetch_related('items')
+            .with_restaurants_and_distances(
+                limit=settings.ORDER_BOARD_RESTAURANTS_LIMIT,
+                max_km=settings.ORDER_BOARD_MAX_DISTANCE_KM,
+            )
+        )
 
-        coordinates = get_or_create_locations(list(all_addresses))
+        candidates = []
+        for order in orders:
+            if order.restaurants_with_distances == 'ADDRESS_NOT_FOUND':
+                continue
+            for rank, restaurant in enumerate(
+                order.restaurants_with_distances,
+                start=1
+            ):
+                candidates.append(
+                    OrderCandidate(
+                        order=order,
+                        restaurant_id=restaurant['restaurant_id'],
+                        distance_km=restaurant['distance_km'],
+                        rank=rank,
+                    )
+                )
 
-        restaurants_by_order_id = self._match_orders_to_restaurants(
-            restaurant_products, restaurant_info, coordinates
-        )
+        order_ids = [order.id for order in orders]
+        located_order_ids = [
+            order.id for order in orders
+            if order.location_id or not order.address.strip()
+        ]
+        with transaction.atomic():
+            # concurrent refreshes of the same orders take turns here
+            list(
+                self.model.objects
+                .filter(id__in=order_ids)
+                .order_by('id')
+                .select_for_update()
+                .values_list('id', flat=True)
+            )
+            OrderCandidate.objects.filter(order_id__in=order_ids).delete()
+            OrderCandidate.objects.bulk_create(candidates)
+            now = timezone.now()
+            self.model.objects.filter(id__in=located_order_ids).update(
+                candidates_refreshed_at=now,
+                changed_at=now,
+            )
 
-        for order in self:
-            order.restaurants_with_distances = restaurants_by_order_id.get(
-                order.id,
-                []
+    def with_candidate_restaurants(self):
+        orders = self.prefetch_related(
+            Prefetch(
+                'candidates',
+                queryset=(
+                    OrderCandidate.objects
+                    .select_related('restaurant')
+                    .only('order_id', 'distance_km', 'restaurant__name')
+                    .order_by('rank')
+                )
             )
+        )
 
-        return self
+        not_prepared_order_ids = []
+        for order in orders:
+            if order.candidates_refreshed_at is None:
+                not_prepared_order_ids.append(order.id)
 
-    def _get_restaurant_data(self):
-        menu_items = (
-            RestaurantMenuItem.objects
-            .filter(availability=True)
-            .select_related('restaurant')
+            if order.location_id and order.location.coordinates is None:
+                order.restaurants_with_distances = 'ADDRESS_NOT_FOUND'
+                continue
+            order.restaurants_with_distances = [
+                {
+                    'name': candidate.restaurant.name,
+                    'distance_km': candidate.distance_km,
+                }
+                for candidate in order.candidates.all()
+            ]
+
+        if not_prepared_order_ids:
+            prepare_orders_in_background(not_prepared_order_ids)
+
+        return orders
+
+    def attach_locations(self):
+        orders = list(
+            self.filter(location__isnull=True)
+            .exclude(address='')
+            .only('id', 'address')
+        )
+        if not orders:
+            return
+
+        addresses = [order.address for order in orders]
+        get_or_create_locations(addresses)
+        location_ids = dict(
+            Location.objects
+            .filter(
+                canonical_address__in=[
+                    normalize_address(address) for address in addresses
+                ]
+            )
+            .values_list('canonical_address', 'id')
         )
 
-        restaurant_products = defaultdict(set)
-        restaurant_info = {}
+        order_ids_by_location_id = defaultdict(list)
+        for order in orders:
+            location_id = location_ids.get(normalize_address(order.address))
+            if location_id:
+                order_ids_by_location_id[location_id].append(order.id)
 
-        for item in menu_items:
-            restaurant_products[item.restaurant_id].add(item.product_id)
-            restaurant_info[item.restaurant_id] = {
-                'name': item.restaurant.name,
-                'address': item.restaurant.address
-            }
+        for location_id, order_ids in order_ids_by_location_id.items():
+            self.model.objects.filter(id__in=order_ids).update(
+                location_id=location_id,
+                changed_at=timezone.now(),
+            )
 
-        return restaurant_products, restaurant_info
+    def with_restaurants_and_distances(self, limit=None, max_km=None):
+        availability_index, restaurant_info = self._get_restaurant_data()
 
-    def _collect_addresses(self, restaurant_info):
-        all_addresses = set()
+        if limit is None and max_km is None:
+            restaurants_by_order_id = self._match_orders_to_restaurants(
+                availability_index, restaurant_info
+            )
+        else:
+            restaurants_by_order_id = self._match_nearest_restaurants(
+                availability_index, restaurant_info, limit, max_km
+            )
 
         for order in self:
-            if order.address and order.address.strip():
-                all_addresses.add(order.address.strip())
+            order.restaurants_with_distances = restaurants_by_order_id.get(
+                order.id,
+                []
+            )
 
-        for info in restaurant_info.values():
-            if info['address'] and info['address'].strip():
-                all_addresses.add(info['address'].strip())
+        return self
 
-        return all_addresses
+    def _get_restaurant_data(self):
+        snapshot = get_menu_snapshot()
+        return snapshot.availability_index, snapshot.restaurant_info
 
     def _match_orders_to_restaurants(
-                                    self, restaurant_products,
-                                    restaurant_info, coordinates):
-        order_product_map = {}
+                                    self, availability_index,
+                                    restaurant_info):
+        order_product_map, customer_coords_by_order_id = (
+            self._get_order_data()
+        )
 
-        for order in self:
-            product_ids = {item.product_id for item in order.items.all()}
-            order_product_map[order.id] = product_ids
+        distances_by_order_id = self._calculate_distances(
+            customer_coords_by_order_id, restaurant_info
+        )
 
         restaurants_by_order_id = {}
 
@@ -206,16 +365,13 @@ class OrderQuerySet(models.QuerySet):
                 restaurants_by_order_id[order.id] = []
                 continue
 
-            customer_address = order.address.strip() if order.address else ''
-            customer_coords = coordinates.get(customer_address)
-
-            if customer_coords == 'NOT_FOUND':
+            if customer_coords_by_order_id[order.id] == 'NOT_FOUND':
                 restaurants_by_order_id[order.id] = 'ADDRESS_NOT_FOUND'
                 continue
 
             restaurants_list = self._get_restaurants_for_order(
-                order, product_ids, restaurant_products,
-                restaurant_info, coordinates, customer_coords
+                product_ids, availability_index,
+                restaurant_info, distances_by_order_id[order.id]
             )
 
             restaurants_list.sort(
@@ -229,31 +385,103 @@ class OrderQuerySet(models.QuerySet):
 
         return restaurants_by_order_id
 
-    def _get_restaurants_for_order(
-                                self, order, product_ids,
-                                restaurant_products, restaurant_info,
-                                coordinates, customer_coords):
-        restaurants_list = []
+    def _match_nearest_restaurants(
+                                self, availability_index,
+                                restaurant_info, limit, max_km):
+        order_product_map, customer_coords_by_order_id = (
+            self._get_order_data()
+        )
+        spatial_index = RestaurantSpatialIndex({
+            restaurant_id: info['coordinates']
+            for restaurant_id, info in restaurant_info.items()
+        })
+
+        restaurants_by_order_id = {}
+
+        for order in self:
+            product_ids = order_product_map[order.id]
+            customer_coords = customer_coords_by_order_id[order.id]
+            if not product_ids:
+                restaurants_by_order_id[order.id] = []
+                continue
 
-        for restaurant_id, products in restaurant_products.items():
-            if not product_ids.issubset(products):
+            if customer_coords == 'NOT_FOUND':
+                restaurants_by_order_id[order.id] = 'ADDRESS_NOT_FOUND'
                 continue
 
-            rest_info = restaurant_info[restaurant_id]
-            restaurant_addr = (
-                rest_info['address'].strip()
-                if rest_info['address']
-                else ""
-            )
-            restaurant_coords = coordinates.get(restaurant_addr)
+            if customer_coords is None:
+                restaurant_ids = availability_index.find_restaurants(
+                    product_ids
+                )
+                restaurants_by_order_id[order.id] = [
+                    {
+                        'restaurant_id': restaurant_id,
+                        'name': restaurant_info[restaurant_id]['name'],
+                        'distance_km': None,
+                    }
+                    for restaurant_id in restaurant_ids[:limit]
+                ]
+                continue
 
-            distance_km = self._calculate_distance(
+            nearest = spatial_index.find_nearest(
                 customer_coords,
-                restaurant_coords
+                limit=limit,
+                max_km=max_km,
+                accept=availability_index.make_checker(product_ids),
             )
+            restaurants_list = [
+                {
+                    'restaurant_id': restaurant_id,
+                    'name': restaurant_info[restaurant_id]['name'],
+                    'distance_km': round(distance_km, 2),
+                }
+                for distance_km, restaurant_id in nearest
+            ]
+            if max_km is None:
+                restaurants_list.extend(
+                    {
+                        'restaurant_id': restaurant_id,
+                        'name': restaurant_info[restaurant_id]['name'],
+                        'distance_km': None,
+                    }
+                    for restaurant_id in availability_index.find_restaurants(
+                        product_ids
+                    )
+                    if not restaurant_info[restaurant_id]['coordinates']
+                )
+            restaurants_by_order_id[order.id] = restaurants_list[:limit]
+
+        return restaurants_by_order_id
+
+    def _get_order_data(self):
+        order_product_map = {}
+        customer_coords_by_order_id = {}
+
+        for order in self:
+            product_ids = {item.product_id for item in order.items.all()}
+            order_product_map[order.id] = product_ids
+
+            if order.location_id is None:
+                customer_coords_by_order_id[order.id] = None
+            else:
+                customer_coords_by_order_id[order.id] = (
+                    order.location.coordinates or 'NOT_FOUND'
+                )
+
+        return order_product_map, customer_coords_by_order_id
+
+    def _get_restaurants_for_order(
+                                self, product_ids,
+                                availability_index, restaurant_info,
+                                distances):
+        restaurants_list = []
+
+        for restaurant_id in availability_index.find_restaurants(product_ids):
+            distance_km = distances.get(restaurant_id)
 
             restaurants_list.append({
-                'name': rest_info['name'],
+                'restaurant_id': restaurant_id,
+                'name': restaurant_info[restaurant_id]['name'],
                 'distance_km': (
                     round(distance_km, 2)
                     if distance_km
@@ -263,18 +491,32 @@ class OrderQuerySet(models.QuerySet):
 
         return restaurants_list
 
-    def _calculate_distance(self, customer_coords, restaurant_coords):
-        if restaurant_coords == 'NOT_FOUND':
-            return None
-        elif customer_coords and restaurant_coords:
-            try:
-                return geodesic(
-                    customer_coords,
-                    restaurant_coords
-                ).km
-            except Exception:
-                return None
-        return None
+    def _calculate_distances(self, customer_coords_by_order_id,
+                             restaurant_info):
+        restaurant_ids = [
+            restaurant_id for restaurant_id, info in restaurant_info.items()
+            if info['coordinates']
+        ]
+        location_ids = {
+            order.location_id for order in self
+            if isinstance(customer_coords_by_order_id[order.id], tuple)
+        }
+        distances_by_location_id = DeliveryDistance.objects.get_or_calculate(
+            {
+                order.location_id: customer_coords_by_order_id[order.id]
+                for order in self
+                if order.location_id in location_ids
+            },
+            {
+                restaurant_id: restaurant_info[restaurant_id]['coordinates']
+                for restaurant_id in restaurant_ids
+            },
+        )
+
+        return {
+            order.id: distances_by_location_id.get(order.location_id, {})
+            for order in self
+        }
 
 
 class Order(models.Model):
@@ -345,6 +587,25 @@ class Order(models.Model):
         blank=True,
         db_index=True
     )
+    candidates_refreshed_at = models.DateTimeField(
+        'рестораны подобраны',
+        null=True,
+        blank=True,
+        editable=False,
+    )
+    changed_at = models.DateTimeField(
+        'изменён',
+        auto_now=True,
+        db_index=True,
+    )
+    location = models.ForeignKey(
+        Location,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name='координаты адреса',
+        related_name='orders'
+    )
     objects = OrderQuerySet.as_manager()
 
     class Meta:
@@ -355,6 +616,145 @@ class Order(models.Model):
         return f'Заказ {self.id} - {self.first_name} {self.last_name}'
 
 
+MENU_VERSION_KEY = 'foodcartapp:menu_version'
+MENU_SNAPSHOT_KEY = 'foodcartapp:menu_snapshot:{version}'
+CATALOG_VERSION_KEY = 'foodcartapp:catalog_version'
+
+current_menu_snapshot = None
+
+
+def get_menu_version():
+    cache = caches[settings.MENU_SNAPSHOT_CACHE]
+    version = cache.get(MENU_VERSION_KEY)
+    if version is None:
+        cache.add(MENU_VERSION_KEY, uuid4().hex, None)
+        version = cache.get(MENU_VERSION_KEY)
+    return version
+
+
+def bump_menu_version():
+    cache = caches[settings.MENU_SNAPSHOT_CACHE]
+    cache.set(MENU_VERSION_KEY, uuid4().hex, None)
+
+
+def build_menu_snapshot_data():
+    menu_items = (
+        RestaurantMenuItem.objects
+        .filter(availability=True)
+        .values_list(
+            'product_id',
+            'restaurant_id',
+            'restaurant__name',
+            'restaurant__address',
+            'restaurant__lat',
+            'restaurant__lon',
+        )
+    )
+
+    restaurant_products = defaultdict(set)
+    restaurant_info = {}
+
+    for product_id, restaurant_id, name, address, lat, lon in menu_items:
+        restaurant_products[restaurant_id].add(product_id)
+        restaurant_info[restaurant_id] = {
+            'name': name,
+            'address': address,
+            'coordinates': (
+                (lat, lon)
+                if lat is not None and lon is not None
+                else None
+            ),
+        }
+
+    return dict(restaurant_products), restaurant_info
+
+
+def get_menu_snapshot():
+    global current_menu_snapshot
+
+    version = get_menu_version()
+    ttl = settings.MENU_SNAPSHOT_TTL
+    snapshot = current_menu_snapshot
+    if snapshot is not None and snapshot.is_fresh(version, ttl):
+        return snapshot
+
+    cache = caches[settings.MENU_SNAPSHOT_CACHE]
+    key = MENU_SNAPSHOT_KEY.format(version=version)
+    data = cache.get(key)
+    if data is None:
+        data = build_menu_snapshot_data()
+        cache.set(key, data, ttl)
+
+    current_menu_snapshot = MenuSnapshot(version, *data)
+    return current_menu_snapshot
+
+
+def get_catalog_version():
+    cache = caches[settings.CATALOG_CACHE]
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, (uuid4().hex, timezone.now()), None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    cache = caches[settings.CATALOG_CACHE]
+    version = (uuid4().hex, timezone.now())
+    cache.set(CATALOG_VERSION_KEY, version, None)
+    return version
+
+
+def prepare_orders(order_ids):
+    orders = Order.objects.filter(id__in=order_ids)
+    orders.attach_locations()
+    orders.refresh_candidates()
+
+
+def prepare_orders_in_background(order_ids):
+    order_ids = tuple(sorted(order_ids))
+    run_in_background(
+        prepare_orders,
+        order_ids,
+        key=('prepare_orders', order_ids),
+    )
+
+
+def refresh_candidates_for_products(product_ids):
+    (
+        Order.objects
+        .active()
+        .filter(items__product_id__in=product_ids)
+        .distinct()
+        .refresh_candidates()
+    )
+
+
+def refresh_candidates_for_locations(location_ids):
+    order_ids = list(
+        Order.objects
+        .active()
+        .filter(location_id__in=location_ids)
+        .values_list('id', flat=True)
+    )
+    if order_ids:
+        prepare_orders_in_background(order_ids)
+
+
+def refresh_candidates_for_active_orders():
+    Order.objects.active().refresh_candidates()
+
+
+def forget_restaurant_distances(restaurant_ids):
+    DeliveryDistance.objects.filter(restaurant_id__in=restaurant_ids).delete()
+    transaction.on_commit(
+        lambda: run_in_background(
+            refresh_candidates_for_active_orders,
+            key=('refresh_candidates_for_active_orders',),
+        )
+    )
+
+
 class OrderItem(models.Model):
     order = models.ForeignKey(
         Order,
@@ -385,3 +785,146 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f'{self.product} * {self.quantity} по {self.price} руб'
+
+
+class OrderCandidate(models.Model):
+    order = models.ForeignKey(
+        Order,
+        related_name='candidates',
+        verbose_name='заказ',
+        on_delete=models.CASCADE
+    )
+    restaurant = models.ForeignKey(
+        Restaurant,
+        related_name='order_candidates',
+        verbose_name='ресторан',
+        on_delete=models.CASCADE
+    )
+    distance_km = models.FloatField(
+        'расстояние, км',
+        null=True,
+        blank=True
+    )
+    rank = models.PositiveIntegerField('место в списке')
+
+    class Meta:
+        verbose_name = 'подходящий ресторан'
+        verbose_name_plural = 'подходящие рестораны'
+        unique_together = [
+            ['order', 'restaurant']
+        ]
+        indexes = [
+            models.Index(fields=['order', 'rank']),
+        ]
+
+    def __str__(self):
+        return f'{self.order_id}: {self.restaurant_id} ({self.distance_km} км)'
+
+
+class DeliveryDistanceQuerySet(models.QuerySet):
+    def get_or_calculate(self, location_coords, restaurant_coords):
+        if not location_coords or not restaurant_coords:
+            return {}
+
+        precision = settings.DISTANCE_PRECISION
+        distances = defaultdict(dict)
+        used_ids = []
+        for distance_id, location_id, restaurant_id, distance_km in (
+            self.filter(
+                location_id__in=location_coords,
+                restaurant_id__in=restaurant_coords,
+                precision=precision,
+            )
+            .values_list('id', 'location_id', 'restaurant_id', 'distance_km')
+        ):
+            distances[location_id][restaurant_id] = distance_km
+            used_ids.append(distance_id)
+
+        missing_location_ids = [
+            location_id for location_id in location_coords
+            if len(distances[location_id]) < len(restaurant_coords)
+        ]
+        now = timezone.now()
+        if missing_location_ids:
+            restaurant_ids = list(restaurant_coords)
+            matrix = distance_matrix(
+                [
+                    location_coords[location_id]
+                    for location_id in missing_location_ids
+                ],
+                [
+                    restaurant_coords[restaurant_id]
+                    for restaurant_id in restaurant_ids
+                ],
+                precision,
+            )
+            new_distances = []
+            for row, location_id in enumerate(missing_location_ids):
+                for restaurant_id, distance_km in zip(
+                    restaurant_ids,
+                    matrix[row]
+                ):
+                    if restaurant_id in distances[location_id]:
+                        continue
+                    if isnan(distance_km):
+                        continue
+                    distances[location_id][restaurant_id] = float(distance_km)
+                    new_distances.append(
+                        DeliveryDistance(
+                            location_id=location_id,
+                            restaurant_id=restaurant_id,
+                            distance_km=float(distance_km),
+                            precision=precision,
+                            last_used_at=now,
+                        )
+                    )
+            self.bulk_create(new_distances, ignore_conflicts=True)
+
+        if used_ids:
+            # touch rows at most once a day to keep board refreshes read-only
+            self.filter(
+                id__in=used_ids,
+                last_used_at__lt=now - timedelta(days=1)
+            ).update(last_used_at=now)
+
+        return distances
+
+    def stale(self):
+        retention = timedelta(days=settings.DELIVERY_DISTANCE_RETENTION_DAYS)
+        return self.filter(last_used_at__lt=timezone.now() - retention)
+
+
+class DeliveryDistance(models.Model):
+    location = models.ForeignKey(
+        Location,
+        related_name='delivery_distances',
+        verbose_name='адрес клиента',
+        on_delete=models.CASCADE
+    )
+    restaurant = models.ForeignKey(
+        Restaurant,
+        related_name='delivery_distances',
+        verbose_name='ресторан',
+        on_delete=models.CASCADE
+    )
+    distance_km = models.FloatField('расстояние, км')
+    precision = models.CharField(
+        'точность расчёта',
+        max_length=10
+    )
+    last_used_at = models.DateTimeField(
+        'последнее использование',
+        db_index=True
+    )
+
+    objects = DeliveryDistanceQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'расстояние доставки'
+        verbose_name_plural = 'расстояния доставки'
+        unique_together = [
+            ['location', 'restaurant', 'precision']
+        ]
+
+    def __str__(self):
+        return f'{self.location_id} - {self.restaurant_id}: {self.distance_km} км'
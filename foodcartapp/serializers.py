@@ -1,21 +1,50 @@
 from phonenumber_field.serializerfields import PhoneNumberField
 from rest_framework import serializers
+from django.conf import settings
 from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from .catalog import PRODUCT_FIELDS, decode_product_cursor
+from .models import Product, Order, OrderItem, RestaurantMenuItem
+from .models import prepare_orders_in_background
+
+
+class ProductListQuerySerializer(serializers.Serializer):
+    category = serializers.IntegerField(min_value=1, required=False)
+    special_status = serializers.BooleanField(required=False)
+    restaurant = serializers.IntegerField(min_value=1, required=False)
+    fields = serializers.CharField(required=False)
+    cursor = serializers.CharField(required=False)
+    limit = serializers.IntegerField(
+        min_value=1,
+        max_value=settings.PRODUCT_LIST_MAX_PAGE_SIZE,
+        required=False
+    )
+
+    def validate_fields(self, value):
+        fields = [
+            field.strip() for field in value.split(',') if field.strip()
+        ]
+        unknown_fields = [
+            field for field in fields if field not in PRODUCT_FIELDS
+        ]
+        if unknown_fields:
+            raise serializers.ValidationError(
+                f'Неизвестные поля: {", ".join(unknown_fields)}'
+            )
+        return fields
 
-from .models import Product, Order, OrderItem
+    def validate_cursor(self, value):
+        after = decode_product_cursor(value)
+        if after is None:
+            raise serializers.ValidationError('Некорректный курсор')
+        return after
 
 
 class OrderProductSerializer(serializers.Serializer):
     product = serializers.IntegerField(min_value=1)
     quantity = serializers.IntegerField(min_value=1, default=1)
 
-    def validate_product(self, value):
-        if not Product.objects.filter(id=value).exists():
-            raise serializers.ValidationError(
-                f'Недопустимый первичный ключ "{value}"'
-            )
-        return value
-
 
 class OrderCreateSerializer(serializers.ModelSerializer):
     products = OrderProductSerializer(many=True)
@@ -64,28 +93,74 @@ class OrderCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Этот список не может быть пустым'
             )
+
+        products = self.context.get('products')
+        if products is None:
+            products = get_order_products(
+                {item['product'] for item in value}
+            )
+
+        errors = []
+        for item in value:
+            product = products.get(item['product'])
+            if product is None:
+                errors.append({'product': [
+                    f'Недопустимый первичный ключ "{item["product"]}"'
+                ]})
+            elif not product.is_available:
+                errors.append({'product': [
+                    f'Товара "{item["product"]}" сейчас нет в наличии'
+                ]})
+            else:
+                errors.append({})
+                item['product'] = product
+        if any(errors):
+            raise serializers.ValidationError(errors)
         return value
 
     def create(self, validated_data):
-        with transaction.atomic():
-            validated_data['first_name'] = validated_data.pop('firstname')
-            validated_data['last_name'] = validated_data.pop('lastname')
-            validated_data['phone_number'] = validated_data.pop('phonenumber')
-            validated_data['status'] = Order.Status.UNPROCESSED
-            products_data = validated_data.pop('products')
-            order = Order.objects.create(**validated_data)
-
-            order_items = []
-            for item in products_data:
-                product = Product.objects.get(id=item['product'])
-                order_items.append(
-                    OrderItem(
-                        order=order,
-                        product=product,
-                        quantity=item['quantity'],
-                        price=product.price
-                    )
-                )
-
-            OrderItem.objects.bulk_create(order_items)
-            return order
+        [order] = create_orders([validated_data])
+        return order
+
+
+def get_order_products(product_ids):
+    available_menu_items = RestaurantMenuItem.objects.filter(
+        product=OuterRef('pk'),
+        availability=True,
+    )
+    return (
+        Product.objects
+        .annotate(is_available=Exists(available_menu_items))
+        .only('id', 'price')
+        .in_bulk(product_ids)
+    )
+
+
+def create_orders(orders_data):
+    orders = [
+        Order(
+            first_name=order_data['firstname'],
+            last_name=order_data['lastname'],
+            phone_number=order_data['phonenumber'],
+            address=order_data['address'],
+            status=Order.Status.UNPROCESSED,
+        )
+        for order_data in orders_data
+    ]
+    with transaction.atomic():
+        Order.objects.bulk_create(orders)
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=item['product'],
+                quantity=item['quantity'],
+                price=item['product'].price
+            )
+            for order, order_data in zip(orders, orders_data)
+            for item in order_data['products']
+        ])
+        order_ids = [order.id for order in orders]
+        transaction.on_commit(
+            lambda: prepare_orders_in_background(order_ids)
+        )
+    return orders
@@ -1,7 +1,32 @@
-from django.db.models.signals import post_save
+import threading
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
+
+from geocoding.models import Location
+from geocoding.tasks import run_in_background
+from geocoding.utils import locations_resolved
+
+from .catalog import refresh_catalog
+from .models import DeliveryDistance, Order, OrderItem, Product, Restaurant
+from .models import ProductCategory, RestaurantMenuItem
+from .models import bump_menu_version
+from .models import prepare_orders_in_background
+from .models import refresh_candidates_for_locations
+from .models import refresh_candidates_for_products
+
+
+changed_products = threading.local()
+
 
-from .models import Order
+def on_commit_once(func):
+    connection = transaction.get_connection()
+    for _, scheduled_func, _ in connection.run_on_commit:
+        if scheduled_func is func:
+            return
+    transaction.on_commit(func)
 
 
 @receiver(post_save, sender=Order)
@@ -11,5 +36,75 @@ def update_order_status(sender, instance, **kwargs):
         instance.status ==Order.Status.UNPROCESSED
     ):
         Order.objects.filter(pk=instance.pk).update(
-            status=Order.Status.RESTAURANT_CONFIRMED
+            status=Order.Status.RESTAURANT_CONFIRMED,
+            changed_at=timezone.now(),
+        )
+
+
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_menu_snapshot(sender, instance, **kwargs):
+    on_commit_once(bump_menu_version)
+
+
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+def invalidate_catalog(sender, instance, **kwargs):
+    on_commit_once(refresh_catalog)
+
+
+def refresh_candidates_for_changed_products():
+    product_ids = tuple(sorted(getattr(changed_products, 'ids', ())))
+    changed_products.ids = set()
+    if product_ids:
+        run_in_background(
+            refresh_candidates_for_products,
+            product_ids,
+            key=('refresh_candidates_for_products', product_ids),
         )
+
+
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+def refresh_candidates_for_menu_item(sender, instance, **kwargs):
+    if not hasattr(changed_products, 'ids'):
+        changed_products.ids = set()
+    changed_products.ids.add(instance.product_id)
+    on_commit_once(refresh_candidates_for_changed_products)
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def refresh_candidates_for_order_item(sender, instance, **kwargs):
+    order_id = instance.order_id
+    transaction.on_commit(
+        lambda: prepare_orders_in_background([order_id])
+    )
+
+
+@receiver(post_save, sender=Location)
+def forget_delivery_distances(sender, instance, created, **kwargs):
+    if not created:
+        DeliveryDistance.objects.filter(location=instance).delete()
+        location_id = instance.id
+        transaction.on_commit(
+            lambda: refresh_candidates_for_locations([location_id])
+        )
+
+
+@receiver(locations_resolved)
+def refresh_candidates_for_resolved_locations(sender, location_ids,
+                                              **kwargs):
+    transaction.on_commit(
+        lambda: refresh_candidates_for_locations(location_ids)
+    )
@@ -0,0 +1,732 @@
+import gzip
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from geocoding.models import Location
+from geocoding.utils import regeocode_expired_locations
+
+from .dispatch import get_free_capacities, solve_assignment
+from .models import DeliveryDistance, Order, OrderCandidate, OrderItem
+from .models import Product, ProductCategory, Restaurant, RestaurantMenuItem
+from .models import bump_menu_version
+from .models import refresh_candidates_for_active_orders
+from .models import refresh_candidates_for_products
+
+
+RESTAURANTS_COUNT = 5
+PRODUCTS_COUNT = 30
+ORDERS_COUNT = 40
+ITEMS_PER_ORDER = 3
+
+
+def seed_dataset():
+    categories = ProductCategory.objects.bulk_create([
+        ProductCategory(name=f'Категория {number}')
+        for number in range(3)
+    ])
+    restaurants = Restaurant.objects.bulk_create([
+        Restaurant(
+            name=f'Ресторан {number}',
+            address=f'Москва, Ресторанная улица, {number}',
+            lat=55.7 + number / 100,
+            lon=37.6 + number / 100,
+        )
+        for number in range(RESTAURANTS_COUNT)
+    ])
+    products = Product.objects.bulk_create([
+        Product(
+            name=f'Бургер {number}',
+            category=categories[number % len(categories)],
+            price=Decimal(100 + number),
+            image='burger.jpg',
+        )
+        for number in range(PRODUCTS_COUNT)
+    ])
+    RestaurantMenuItem.objects.bulk_create([
+        RestaurantMenuItem(
+            restaurant=restaurant,
+            product=product,
+            availability=(product.id + restaurant.id) % 4 != 0,
+        )
+        for restaurant in restaurants
+        for product in products
+    ])
+
+    location = Location.objects.create(
+        address='Москва, Клиентская улица, 1',
+        lat=55.75,
+        lon=37.62,
+    )
+    orders = Order.objects.bulk_create([
+        Order(
+            first_name='Иван',
+            last_name=f'Петров {number}',
+            phone_number='+79291000000',
+            address=location.address,
+            location=location,
+            restaurant=restaurants[0] if number % 3 == 0 else None,
+            candidates_refreshed_at=timezone.now(),
+        )
+        for number in range(ORDERS_COUNT)
+    ])
+    OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order,
+            product=products[(order.id + shift) % PRODUCTS_COUNT],
+            quantity=2,
+            price=products[(order.id + shift) % PRODUCTS_COUNT].price,
+        )
+        for order in orders
+        for shift in range(ITEMS_PER_ORDER)
+    ])
+    OrderCandidate.objects.bulk_create([
+        OrderCandidate(
+            order=order,
+            restaurant=restaurant,
+            distance_km=rank * 1.5,
+            rank=rank,
+        )
+        for order in orders
+        for rank, restaurant in enumerate(restaurants, start=1)
+    ])
+
+    return {
+        'restaurants': restaurants,
+        'products': products,
+        'orders': orders,
+    }
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class QueryBudgetTestCase(TestCase):
+    max_query_seconds = 0.5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dataset = seed_dataset()
+        cls.manager = User.objects.create_superuser(
+            'manager',
+            'manager@example.com',
+            'password',
+        )
+
+    @contextmanager
+    def assertQueryBudget(self, max_queries):
+        with CaptureQueriesContext(connection) as context:
+            yield context
+
+        queries_count = len(context.captured_queries)
+        query_seconds = sum(
+            float(query['time']) for query in context.captured_queries
+        )
+        executed = '\n'.join(
+            query['sql'] for query in context.captured_queries
+        )
+        self.assertLessEqual(
+            queries_count,
+            max_queries,
+            f'{queries_count} SQL-запросов вместо {max_queries}:\n{executed}'
+        )
+        self.assertLess(query_seconds, self.max_query_seconds)
+
+
+class ApiQueryBudgetTest(QueryBudgetTestCase):
+    def test_product_list_api(self):
+        with self.assertQueryBudget(1):
+            response = self.client.get('/api/products/')
+        self.assertEqual(response.status_code, 200)
+        restaurants = self.dataset['restaurants']
+        for product in response.json():
+            self.assertLessEqual(
+                {restaurant['id'] for restaurant in product['restaurants']},
+                {restaurant.id for restaurant in restaurants},
+            )
+
+    def test_product_list_api_pagination(self):
+        category = self.dataset['products'][0].category
+        url = (
+            f'/api/products/?category={category.id}'
+            '&fields=id,price&limit=4'
+        )
+        product_ids = []
+        with self.assertQueryBudget(3):
+            while url:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                page = response.json()
+                for product in page['results']:
+                    self.assertEqual(set(product), {'id', 'price'})
+                    product_ids.append(product['id'])
+                url = page['next']
+
+        expected_ids = list(
+            Product.objects.available()
+            .filter(category=category)
+            .order_by('id')
+            .values_list('id', flat=True)
+        )
+        self.assertEqual(product_ids, expected_ids)
+
+        self.assertNotIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+
+        response = self.client.get('/api/products/', {'fields': 'secret'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_product_list_api_not_modified(self):
+        response = self.client.get('/api/products/')
+        with self.assertQueryBudget(0):
+            cached_response = self.client.get('/api/products/')
+            not_modified_response = self.client.get(
+                '/api/products/',
+                HTTP_IF_NONE_MATCH=response['ETag'],
+            )
+        self.assertEqual(cached_response.content, response.content)
+        self.assertEqual(not_modified_response.status_code, 304)
+
+        gzip_response = self.client.get(
+            '/api/products/',
+            HTTP_ACCEPT_ENCODING='gzip, deflate',
+        )
+        self.assertEqual(gzip_response['Content-Encoding'], 'gzip')
+        self.assertEqual(
+            gzip.decompress(gzip_response.content),
+            response.content
+        )
+        self.assertNotEqual(gzip_response['ETag'], response['ETag'])
+
+        refused_gzip_response = self.client.get(
+            '/api/products/',
+            HTTP_ACCEPT_ENCODING='gzip;q=0, identity',
+        )
+        self.assertNotIn('Content-Encoding', refused_gzip_response)
+        self.assertEqual(refused_gzip_response.content, response.content)
+
+        with (
+            mock.patch('foodcartapp.catalog.run_in_background'),
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            self.dataset['products'][0].save()
+        response = self.client.get(
+            '/api/products/',
+            HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_product_list_api_follows_restaurant_changes(self):
+        restaurant = Restaurant.objects.get(
+            pk=self.dataset['restaurants'][0].pk
+        )
+        with (
+            mock.patch('foodcartapp.catalog.run_in_background') as rebuild,
+            mock.patch('foodcartapp.signals.run_in_background'),
+            self.captureOnCommitCallbacks(execute=True),
+            transaction.atomic(),
+        ):
+            restaurant.name = 'Переименованный ресторан'
+            restaurant.save()
+            for menu_item in restaurant.menu_items.all():
+                menu_item.save()
+        rebuild.assert_called_once()
+
+        response = self.client.get('/api/products/')
+        restaurant_names = {
+            restaurant['name']
+            for product in response.json()
+            for restaurant in product['restaurants']
+        }
+        self.assertIn('Переименованный ресторан', restaurant_names)
+
+    def test_register_order(self):
+        products = self.dataset['products']
+        payload = {
+            'firstname': 'Иван',
+            'lastname': 'Петров',
+            'phonenumber': '+79291000000',
+            'address': 'Москва, Клиентская улица, 1',
+            'products': [
+                {'product': product.id, 'quantity': 1}
+                for product in products
+            ],
+        }
+        with self.assertQueryBudget(5):
+            response = self.client.post(
+                '/api/order/',
+                payload,
+                content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['products'], payload['products'])
+
+        RestaurantMenuItem.objects.filter(product=products[1]).update(
+            availability=False
+        )
+        payload['products'] = [
+            {'product': products[0].id, 'quantity': 1},
+            {'product': products[1].id, 'quantity': 1},
+            {'product': 10 ** 6, 'quantity': 1},
+        ]
+        with self.assertQueryBudget(1):
+            response = self.client.post(
+                '/api/order/',
+                payload,
+                content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['products']
+        self.assertEqual(errors[0], {})
+        self.assertIn('product', errors[1])
+        self.assertIn('product', errors[2])
+
+    def test_register_orders_batch(self):
+        products = self.dataset['products']
+        orders = [
+            {
+                'firstname': 'Иван',
+                'lastname': f'Петров {number}',
+                'phonenumber': '+79291000000',
+                'address': 'Москва, Клиентская улица, 1',
+                'products': [
+                    {'product': product.id, 'quantity': 1}
+                    for product in products[number:number + ITEMS_PER_ORDER]
+                ],
+            }
+            for number in range(20)
+        ]
+        orders_count = Order.objects.count()
+        with self.assertQueryBudget(5):
+            response = self.client.post(
+                '/api/orders/batch/',
+                {'orders': orders},
+                content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['orders']), len(orders))
+        self.assertEqual(Order.objects.count(), orders_count + len(orders))
+
+        orders[1]['products'] = [{'product': 10 ** 6, 'quantity': 1}]
+        response = self.client.post(
+            '/api/orders/batch/',
+            {'orders': orders},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Order.objects.count(), orders_count + len(orders))
+
+        response = self.client.post(
+            '/api/orders/batch/',
+            {'orders': orders, 'allow_partial': True},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 207)
+        results = response.json()['orders']
+        self.assertIn('errors', results[1])
+        self.assertIn('id', results[0])
+        self.assertEqual(
+            Order.objects.count(),
+            orders_count + 2 * len(orders) - 1
+        )
+
+
+class AdminQueryBudgetTest(QueryBudgetTestCase):
+    def setUp(self):
+        self.client.force_login(self.manager)
+
+    def test_changelists(self):
+        changelists = [
+            'foodcartapp/restaurant',
+            'foodcartapp/product',
+            'foodcartapp/productcategory',
+            'foodcartapp/order',
+            'geocoding/location',
+        ]
+        for changelist in changelists:
+            with self.subTest(changelist=changelist):
+                with self.assertQueryBudget(6):
+                    response = self.client.get(f'/admin/{changelist}/')
+                self.assertEqual(response.status_code, 200)
+
+    def test_restaurant_change_page(self):
+        restaurant = self.dataset['restaurants'][0]
+        with self.assertQueryBudget(9):
+            response = self.client.get(
+                f'/admin/foodcartapp/restaurant/{restaurant.id}/change/'
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_order_change_page(self):
+        order = self.dataset['orders'][0]
+        with self.assertQueryBudget(10):
+            response = self.client.get(
+                f'/admin/foodcartapp/order/{order.id}/change/'
+            )
+        self.assertEqual(response.status_code, 200)
+
+
+class OrderCandidatesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.dataset = seed_dataset()
+
+    def run_jobs_inline(self):
+        return mock.patch(
+            'foodcartapp.models.run_in_background',
+            side_effect=lambda func, *args, key=None: func(*args),
+        )
+
+    def test_regeocoded_location_refreshes_candidates(self):
+        location = Location.objects.create(
+            address='Москва, Потерянная улица, 7',
+            failed_attempts=1,
+            retry_at=timezone.now() - timedelta(minutes=1),
+        )
+        order = self.dataset['orders'][1]
+        Order.objects.filter(pk=order.pk).update(location=location)
+        OrderCandidate.objects.filter(order=order).delete()
+
+        fetched = {location.address: (55.75, 37.62)}
+        with (
+            self.run_jobs_inline(),
+            mock.patch(
+                'geocoding.utils.fetch_coordinates_concurrently',
+                return_value=fetched,
+            ),
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            regeocode_expired_locations()
+
+        self.assertTrue(OrderCandidate.objects.filter(order=order).exists())
+
+    def test_nearest_restaurants_keep_restaurants_without_coordinates(self):
+        restaurants = self.dataset['restaurants']
+        RestaurantMenuItem.objects.update(availability=True)
+        Restaurant.objects.filter(pk=restaurants[-1].pk).update(
+            lat=None,
+            lon=None,
+        )
+        bump_menu_version()
+        self.addCleanup(bump_menu_version)
+        orders = Order.objects.filter(
+            pk=self.dataset['orders'][1].pk
+        ).select_related('location').prefetch_related('items')
+
+        [order] = orders.with_restaurants_and_distances(limit=len(restaurants))
+        self.assertEqual(
+            [
+                restaurant['restaurant_id']
+                for restaurant in order.restaurants_with_distances
+                if restaurant['distance_km'] is None
+            ],
+            [restaurants[-1].id]
+        )
+        self.assertIsNone(order.restaurants_with_distances[-1]['distance_km'])
+
+        [order] = orders.with_restaurants_and_distances(limit=2)
+        self.assertEqual(len(order.restaurants_with_distances), 2)
+
+        [order] = orders.with_restaurants_and_distances(max_km=1000)
+        self.assertEqual(
+            len(order.restaurants_with_distances),
+            len(restaurants) - 1
+        )
+
+    def test_menu_changes_refresh_candidates_once_per_commit(self):
+        menu_items = RestaurantMenuItem.objects.order_by('id')[:3]
+        with (
+            mock.patch('foodcartapp.catalog.run_in_background'),
+            mock.patch('foodcartapp.signals.run_in_background') as run,
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            for menu_item in menu_items:
+                menu_item.availability = not menu_item.availability
+                menu_item.save()
+
+        product_ids = tuple(sorted(
+            {menu_item.product_id for menu_item in menu_items}
+        ))
+        run.assert_called_once_with(
+            refresh_candidates_for_products,
+            product_ids,
+            key=('refresh_candidates_for_products', product_ids),
+        )
+
+    def test_restaurants_limit_applies_with_and_without_coordinates(self):
+        located_order = self.dataset['orders'][1]
+        Order.objects.filter(pk=self.dataset['orders'][2].pk).update(
+            location=None
+        )
+        orders = Order.objects.filter(
+            pk__in=[located_order.pk, self.dataset['orders'][2].pk]
+        ).select_related('location').prefetch_related('items')
+
+        for order in orders.with_restaurants_and_distances(max_km=1000):
+            self.assertGreater(len(order.restaurants_with_distances), 0)
+
+        for limit in [0, 1]:
+            for order in orders.with_restaurants_and_distances(limit=limit):
+                self.assertEqual(
+                    len(order.restaurants_with_distances),
+                    limit,
+                    order.location_id
+                )
+
+
+class DeliveryDistanceTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        [cls.restaurant] = Restaurant.objects.bulk_create([
+            Restaurant(
+                name='Ресторан',
+                address='Москва, Ресторанная улица, 1',
+                lat=55.70,
+                lon=37.60,
+            )
+        ])
+        cls.location = Location.objects.create(
+            address='Москва, Клиентская улица, 1',
+            lat=55.75,
+            lon=37.62,
+        )
+
+    def get_distances(self):
+        return DeliveryDistance.objects.get_or_calculate(
+            {self.location.id: self.location.coordinates},
+            {self.restaurant.id: self.restaurant.coordinates},
+        )
+
+    def test_get_or_calculate_caches_distances(self):
+        with self.assertNumQueries(2):
+            distances = self.get_distances()
+        distance_km = distances[self.location.id][self.restaurant.id]
+        self.assertGreater(distance_km, 0)
+
+        with (
+            mock.patch('foodcartapp.models.distance_matrix') as matrix,
+            self.assertNumQueries(2),
+        ):
+            distances = self.get_distances()
+        matrix.assert_not_called()
+        self.assertEqual(
+            distances[self.location.id][self.restaurant.id],
+            distance_km
+        )
+
+    def test_get_or_calculate_touches_stale_rows(self):
+        self.get_distances()
+        long_ago = timezone.now() - timedelta(days=400)
+        DeliveryDistance.objects.update(last_used_at=long_ago)
+        self.assertEqual(DeliveryDistance.objects.stale().count(), 1)
+
+        self.get_distances()
+        self.assertFalse(DeliveryDistance.objects.stale().exists())
+
+    def test_distances_depend_on_precision(self):
+        with override_settings(DISTANCE_PRECISION='fast'):
+            fast = self.get_distances()
+        with override_settings(DISTANCE_PRECISION='exact'):
+            exact = self.get_distances()
+
+        self.assertEqual(DeliveryDistance.objects.count(), 2)
+        self.assertNotEqual(
+            fast[self.location.id][self.restaurant.id],
+            exact[self.location.id][self.restaurant.id]
+        )
+
+    def test_moved_restaurant_forgets_distances(self):
+        self.get_distances()
+        restaurant = Restaurant.objects.get(pk=self.restaurant.pk)
+        restaurant.address = 'Москва, Новая улица, 2'
+        with mock.patch(
+            'foodcartapp.models.get_or_create_locations',
+            return_value={restaurant.address: (55.80, 37.70)},
+        ):
+            restaurant.save()
+        self.assertFalse(DeliveryDistance.objects.exists())
+
+    def test_moved_coordinates_forget_distances(self):
+        self.get_distances()
+        restaurant = Restaurant.objects.get(pk=self.restaurant.pk)
+        restaurant.lat, restaurant.lon = 59.94, 30.31
+        with (
+            mock.patch('foodcartapp.catalog.run_in_background'),
+            mock.patch('foodcartapp.models.run_in_background') as run,
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            restaurant.save()
+
+        self.assertFalse(DeliveryDistance.objects.exists())
+        run.assert_called_once_with(
+            refresh_candidates_for_active_orders,
+            key=('refresh_candidates_for_active_orders',),
+        )
+        distances = DeliveryDistance.objects.get_or_calculate(
+            {self.location.id: self.location.coordinates},
+            {restaurant.id: restaurant.coordinates},
+        )
+        self.assertGreater(distances[self.location.id][restaurant.id], 600)
+
+    def test_geocode_restaurants_forgets_distances_of_moved(self):
+        self.get_distances()
+        with (
+            mock.patch(
+                'foodcartapp.management.commands.geocode_restaurants'
+                '.get_or_create_locations',
+                return_value={self.restaurant.address: (59.94, 30.31)},
+            ),
+            mock.patch('foodcartapp.catalog.run_in_background'),
+            mock.patch('foodcartapp.models.run_in_background') as run,
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            call_command('geocode_restaurants', '--all', stdout=StringIO())
+
+        self.assertFalse(DeliveryDistance.objects.exists())
+        run.assert_called_once()
+
+    def test_geocode_restaurants_keeps_coordinates_during_outage(self):
+        self.get_distances()
+        stdout = StringIO()
+        with mock.patch(
+            'foodcartapp.management.commands.geocode_restaurants'
+            '.get_or_create_locations',
+            return_value={self.restaurant.address: None},
+        ):
+            call_command('geocode_restaurants', '--all', stdout=stdout)
+
+        restaurant = Restaurant.objects.get(pk=self.restaurant.pk)
+        self.assertEqual(restaurant.coordinates, self.restaurant.coordinates)
+        self.assertTrue(DeliveryDistance.objects.exists())
+        self.assertIn(
+            'пропущено из-за недоступности геокодера: 1',
+            stdout.getvalue()
+        )
+
+    def test_changed_location_forgets_distances(self):
+        self.get_distances()
+        self.location.lat = 55.76
+        self.location.save()
+        self.assertFalse(DeliveryDistance.objects.exists())
+
+    def test_prune_delivery_distances_command(self):
+        self.get_distances()
+        other_location = Location.objects.create(
+            address='Москва, Клиентская улица, 2',
+            lat=55.77,
+            lon=37.63,
+        )
+        DeliveryDistance.objects.get_or_calculate(
+            {other_location.id: other_location.coordinates},
+            {self.restaurant.id: self.restaurant.coordinates},
+        )
+        DeliveryDistance.objects.filter(location=other_location).update(
+            last_used_at=timezone.now() - timedelta(days=400)
+        )
+
+        stdout = StringIO()
+        call_command('prune_delivery_distances', stdout=stdout)
+
+        self.assertIn('Удалено расстояний: 1', stdout.getvalue())
+        self.assertQuerySetEqual(
+            DeliveryDistance.objects.values_list('location_id', flat=True),
+            [self.location.id]
+        )
+
+
+class DispatchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.dataset = seed_dataset()
+
+    def brute_force_cost(self, candidates_by_order_id, capacities):
+        order_ids = list(candidates_by_order_id)
+
+        def search(index, free):
+            if index == len(order_ids):
+                return 0, 0
+            best = search(index + 1, free)
+            for restaurant_id, distance_km in (
+                candidates_by_order_id[order_ids[index]]
+            ):
+                if not free.get(restaurant_id):
+                    continue
+                free[restaurant_id] -= 1
+                assigned, cost = search(index + 1, free)
+                free[restaurant_id] += 1
+                option = (assigned + 1, cost + distance_km)
+                if (option[0], -option[1]) > (best[0], -best[1]):
+                    best = option
+            return best
+
+        return search(0, dict(capacities))
+
+    def test_solve_assignment_is_optimal(self):
+        randomizer = random.Random(7)
+        for _ in range(50):
+            capacities = {
+                restaurant_id: randomizer.randint(0, 2)
+                for restaurant_id in range(1, 4)
+            }
+            candidates_by_order_id = {
+                order_id: [
+                    (restaurant_id, randomizer.randint(1, 20))
+                    for restaurant_id in capacities
+                    if randomizer.random() < 0.7
+                ]
+                for order_id in range(1, randomizer.randint(2, 6))
+            }
+
+            assignment = solve_assignment(candidates_by_order_id, capacities)
+
+            distances = {
+                (order_id, restaurant_id): distance_km
+                for order_id, candidates in candidates_by_order_id.items()
+                for restaurant_id, distance_km in candidates
+            }
+            cost = sum(distances[pair] for pair in assignment.items())
+            self.assertEqual(
+                (len(assignment), cost),
+                self.brute_force_cost(candidates_by_order_id, capacities),
+            )
+            for restaurant_id, capacity in capacities.items():
+                self.assertLessEqual(
+                    list(assignment.values()).count(restaurant_id),
+                    capacity,
+                )
+
+    def test_solve_assignment_skips_unassignable_orders(self):
+        assignment = solve_assignment(
+            {1: [(10, 1.5)], 2: [(10, 0.5)], 3: [], 4: [(20, 1.0)]},
+            {10: 1, 20: 0},
+        )
+        self.assertEqual(assignment, {2: 10})
+
+    def test_dispatch_orders_command(self):
+        Restaurant.objects.update(max_active_orders=3)
+        unprocessed_orders = Order.objects.filter(
+            status=Order.Status.UNPROCESSED,
+            restaurant__isnull=True,
+        )
+        unprocessed_count = unprocessed_orders.count()
+
+        call_command('dispatch_orders', '--dry-run', stdout=StringIO())
+        self.assertEqual(unprocessed_orders.count(), unprocessed_count)
+
+        call_command('dispatch_orders', stdout=StringIO())
+        free_capacities = get_free_capacities()
+        self.assertTrue(
+            all(capacity == 0 for capacity in free_capacities.values())
+        )
+        self.assertEqual(
+            unprocessed_orders.count(),
+            unprocessed_count - 3 * (RESTAURANTS_COUNT - 1),
+        )
@@ -1,10 +1,18 @@
+from django.conf import settings
 from django.templatetags.static import static
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import condition
 from rest_framework.decorators import api_view
+from rest_framework.decorators import authentication_classes
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.utils.urls import replace_query_param
 
-from .models import Product
-from .serializers import OrderCreateSerializer
+from .catalog import encode_product_cursor, get_catalog_blob
+from .catalog import is_gzip_accepted, query_products
+from .models import get_catalog_version
+from .serializers import OrderCreateSerializer, ProductListQuerySerializer
+from .serializers import create_orders, get_order_products
 
 
 from django.http import HttpResponse
@@ -39,30 +47,101 @@ def banners_list_api(request):
     return Response(banners)
 
 
+def get_catalog_etag(request):
+    version, _ = get_catalog_version()
+    if is_gzip_accepted(request):
+        return f'{version}-gzip'
+    return version
+
+
+def get_catalog_last_modified(request):
+    _, modified_at = get_catalog_version()
+    return modified_at
+
+
 @api_view(['GET'])
+@authentication_classes([])
 def product_list_api(request):
-    products = Product.objects.select_related('category').available()
-
-    dumped_products = []
-    for product in products:
-        dumped_product = {
-            'id': product.id,
-            'name': product.name,
-            'price': product.price,
-            'special_status': product.special_status,
-            'description': product.description,
-            'category': {
-                'id': product.category.id,
-                'name': product.category.name,
-            } if product.category else None,
-            'image': product.image.url,
-            'restaurant': {
-                'id': product.id,
-                'name': product.name,
-            }
-        }
-        dumped_products.append(dumped_product)
-    return Response(dumped_products)
+    query_serializer = ProductListQuerySerializer(
+        data=request.query_params.dict()
+    )
+    query_serializer.is_valid(raise_exception=True)
+    if query_serializer.validated_data:
+        return filtered_product_list(request, query_serializer.validated_data)
+    return catalog_product_list(request._request)
+
+
+@condition(
+    etag_func=get_catalog_etag,
+    last_modified_func=get_catalog_last_modified,
+)
+def catalog_product_list(request):
+    version, _ = get_catalog_version()
+    blob = get_catalog_blob(version)
+    if is_gzip_accepted(request):
+        response = HttpResponse(blob['gzip'], content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(blob['body'], content_type='application/json')
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+def filtered_product_list(request, params):
+    is_paginated = 'limit' in params or 'cursor' in params
+    limit = params.get('limit', settings.PRODUCT_LIST_MAX_PAGE_SIZE)
+    products, next_after = query_products(
+        fields=params.get('fields'),
+        category=params.get('category'),
+        special_status=params.get('special_status'),
+        restaurant=params.get('restaurant'),
+        after=params.get('cursor'),
+        limit=limit if is_paginated else None,
+    )
+    if not is_paginated:
+        return Response(products)
+
+    next_url = None
+    if next_after is not None:
+        next_url = replace_query_param(
+            request.build_absolute_uri(),
+            'cursor',
+            encode_product_cursor(next_after),
+        )
+    return Response({
+        'next': next_url,
+        'results': products,
+    })
+
+
+def dump_order(order, products_data):
+    return {
+        'id': order.id,
+        'firstname': order.first_name,
+        'lastname': order.last_name,
+        'phonenumber': str(order.phone_number),
+        'address': order.address,
+        'products': [
+            {'product': item['product'].id, 'quantity': item['quantity']}
+            for item in products_data
+        ]
+    }
+
+
+def collect_product_ids(orders_data):
+    product_ids = set()
+    for order_data in orders_data:
+        if not isinstance(order_data, dict):
+            continue
+        products_data = order_data.get('products')
+        if not isinstance(products_data, list):
+            continue
+        for item in products_data:
+            try:
+                product_ids.add(int(item['product']))
+            except (KeyError, TypeError, ValueError):
+                continue
+    return product_ids
 
 
 @api_view(['POST'])
@@ -70,17 +149,77 @@ def register_order(request):
     serializer = OrderCreateSerializer(data=request.data)
     if serializer.is_valid():
         order = serializer.save()
-        response_order = {
-            'id': order.id,
-            'firstname': order.first_name,
-            'lastname': order.last_name,
-            'phonenumber': str(order.phone_number),
-            'address': order.address,
-            'products': [
-                {'product': item.product_id, 'quantity': item.quantity}
-                for item in order.items.all()
-            ]
-        }
+        response_order = dump_order(
+            order,
+            serializer.validated_data['products']
+        )
         return Response(response_order, status=status.HTTP_201_CREATED)
     else:
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['POST'])
+def register_orders_batch(request):
+    orders_data = None
+    if isinstance(request.data, dict):
+        orders_data = request.data.get('orders')
+    if not isinstance(orders_data, list) or not orders_data:
+        return Response(
+            {'orders': ['Ожидался непустой список заказов']},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(orders_data) > settings.ORDER_BATCH_MAX_SIZE:
+        return Response(
+            {'orders': [
+                f'Не больше {settings.ORDER_BATCH_MAX_SIZE} заказов за раз'
+            ]},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    allow_partial = request.data.get('allow_partial') is True
+
+    products = get_order_products(collect_product_ids(orders_data))
+    order_serializers = [
+        OrderCreateSerializer(
+            data=order_data,
+            context={'products': products}
+        )
+        for order_data in orders_data
+    ]
+    valid_serializers = [
+        serializer for serializer in order_serializers
+        if serializer.is_valid()
+    ]
+    has_errors = len(valid_serializers) < len(order_serializers)
+
+    if has_errors and not allow_partial:
+        results = [
+            {'errors': serializer.errors} if serializer.errors else {}
+            for serializer in order_serializers
+        ]
+        return Response(
+            {'orders': results},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    orders = create_orders(
+        [serializer.validated_data for serializer in valid_serializers]
+    )
+    orders_by_serializer = dict(zip(valid_serializers, orders))
+
+    results = []
+    for serializer in order_serializers:
+        order = orders_by_serializer.get(serializer)
+        if order is None:
+            results.append({'errors': serializer.errors})
+        else:
+            results.append(
+                dump_order(order, serializer.validated_data['products'])
+            )
+
+    return Response(
+        {'orders': results},
+        status=(
+            status.HTTP_207_MULTI_STATUS if has_errors
+            else status.HTTP_201_CREATED
+        )
+    )
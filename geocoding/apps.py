@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.core import checks
 
 
 class GeocodingConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "geocoding"
+
+    def ready(self):
+        import geocoding.signals
+        from .checks import check_lease_cache
+
+        checks.register(check_lease_cache)
@@ -0,0 +1,166 @@
+import json
+import random
+import threading
+import time
+from functools import lru_cache
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from . import metrics
+from .normalization import normalize_address
+
+
+class BaseGeocoder:
+    def geocode(self, address):
+        raise NotImplementedError
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow_request(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # half-open: let one request probe the upstream
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class GeocoderUnavailable(Exception):
+    pass
+
+
+class YandexGeocoder(BaseGeocoder):
+    retry_statuses = {429, 500, 502, 503, 504}
+
+    def __init__(self, api_key=None, base_url=None, timeout=None,
+                 retries=None, backoff=None):
+        self.api_key = api_key or settings.YANDEX_API_KEY
+        self.base_url = base_url or settings.GEOCODER_YANDEX_URL
+        self.timeout = timeout or settings.GEOCODER_TIMEOUT
+        self.retries = (
+            settings.GEOCODER_RETRIES if retries is None else retries
+        )
+        self.backoff = (
+            settings.GEOCODER_BACKOFF if backoff is None else backoff
+        )
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.GEOCODER_BREAKER_THRESHOLD,
+            reset_timeout=settings.GEOCODER_BREAKER_RESET_TIMEOUT,
+        )
+
+        # every background job and the request thread fetch concurrently
+        pool_size = settings.GEOCODER_MAX_WORKERS * (
+            settings.GEOCODER_BACKGROUND_WORKERS + 1
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def geocode(self, address):
+        if not self.breaker.allow_request():
+            metrics.geocoder_requests.inc(outcome='circuit_open')
+            raise GeocoderUnavailable(address)
+
+        try:
+            response = self.request_with_retries(address)
+        except GeocoderUnavailable:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+
+        try:
+            found_places = (
+                response.json()
+                ['response']
+                ['GeoObjectCollection']
+                ['featureMember']
+            )
+            if not found_places:
+                metrics.geocoder_requests.inc(outcome='not_found')
+                return None
+
+            most_relevant = found_places[0]
+            lon, lat = most_relevant['GeoObject']['Point']['pos'].split(" ")
+            lat, lon = float(lat), float(lon)
+
+            metrics.geocoder_requests.inc(outcome='ok')
+            return (lat, lon)
+
+        except (KeyError, ValueError, TypeError):
+            metrics.geocoder_requests.inc(outcome='bad_response')
+            raise GeocoderUnavailable(address)
+
+    def request_with_retries(self, address):
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+            try:
+                with metrics.geocoder_latency.time():
+                    response = self.session.get(
+                        self.base_url,
+                        params={
+                            "geocode": address,
+                            "apikey": self.api_key,
+                            "format": "json",
+                        },
+                        timeout=self.timeout
+                    )
+            except requests.Timeout:
+                metrics.geocoder_requests.inc(outcome='timeout')
+                continue
+            except requests.RequestException:
+                metrics.geocoder_requests.inc(outcome='error')
+                continue
+            if response.status_code in self.retry_statuses:
+                metrics.geocoder_requests.inc(outcome='error')
+                continue
+            if not response.ok:
+                metrics.geocoder_requests.inc(outcome='error')
+                # 4xx other than 429 will not get better on retry
+                break
+            return response
+        raise GeocoderUnavailable(address)
+
+
+class FixtureGeocoder(BaseGeocoder):
+    def __init__(self, path=None):
+        path = path or settings.GEOCODER_FIXTURE_PATH
+        with open(path, encoding='utf-8') as fixture_file:
+            fixture = json.load(fixture_file)
+
+        self.coordinates = {
+            normalize_address(address): tuple(coords) if coords else None
+            for address, coords in fixture.items()
+        }
+
+    def geocode(self, address):
+        return self.coordinates.get(normalize_address(address))
+
+
+@lru_cache(maxsize=None)
+def get_geocoder():
+    return import_string(settings.GEOCODER_BACKEND)()
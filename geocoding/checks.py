@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.checks import Warning
+
+
+PROCESS_LOCAL_CACHE_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def check_lease_cache(app_configs, **kwargs):
+    from .utils import geocoding_leases
+
+    alias = geocoding_leases.cache_alias
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    if backend not in PROCESS_LOCAL_CACHE_BACKENDS:
+        return []
+    return [
+        Warning(
+            f'Кэш "{alias}" для аренды адресов живёт внутри одного процесса, '
+            'поэтому разные процессы будут геокодировать один и тот же '
+            'адрес параллельно.',
+            hint=(
+                'Укажите общий кэш в CACHE_URL или его имя в '
+                'GEOCODER_SHARED_CACHE, например Redis или Memcached.'
+            ),
+            id='geocoding.W001',
+        )
+    ]
@@ -0,0 +1,54 @@
+import numpy as np
+from django.conf import settings
+from geopy.distance import geodesic
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def to_array(coordinates):
+    array = np.full((len(coordinates), 2), np.nan)
+    for index, coords in enumerate(coordinates):
+        if coords and coords != 'NOT_FOUND':
+            array[index] = coords
+    return array
+
+
+def haversine_matrix(origins, destinations):
+    origins = np.radians(to_array(origins))
+    destinations = np.radians(to_array(destinations))
+
+    lat1 = origins[:, 0][:, np.newaxis]
+    lon1 = origins[:, 1][:, np.newaxis]
+    lat2 = destinations[:, 0][np.newaxis, :]
+    lon2 = destinations[:, 1][np.newaxis, :]
+
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def geodesic_matrix(origins, destinations):
+    origins = to_array(origins)
+    destinations = to_array(destinations)
+
+    matrix = np.full((len(origins), len(destinations)), np.nan)
+    for row, origin in enumerate(origins):
+        if np.isnan(origin).any():
+            continue
+        for column, destination in enumerate(destinations):
+            if np.isnan(destination).any():
+                continue
+            matrix[row, column] = geodesic(origin, destination).km
+    return matrix
+
+
+def distance_matrix(origins, destinations, precision=None):
+    precision = precision or settings.DISTANCE_PRECISION
+    if not len(origins) or not len(destinations):
+        return np.full((len(origins), len(destinations)), np.nan)
+    if precision == 'exact':
+        return geodesic_matrix(origins, destinations)
+    return haversine_matrix(origins, destinations)
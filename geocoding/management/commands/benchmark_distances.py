@@ -0,0 +1,50 @@
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from geocoding.distances import distance_matrix
+from geocoding.stub_server import MOSCOW_BBOX
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает быстрый и точный расчёт таблицы расстояний'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=500)
+        parser.add_argument('--restaurants', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        randomizer = random.Random(options['seed'])
+        min_lat, min_lon, max_lat, max_lon = MOSCOW_BBOX
+
+        def make_points(count):
+            return [
+                (
+                    randomizer.uniform(min_lat, max_lat),
+                    randomizer.uniform(min_lon, max_lon),
+                )
+                for _ in range(count)
+            ]
+
+        orders = make_points(options['orders'])
+        restaurants = make_points(options['restaurants'])
+
+        results = {}
+        for precision in ['fast', 'exact']:
+            started_at = time.perf_counter()
+            matrix = distance_matrix(orders, restaurants, precision)
+            elapsed = time.perf_counter() - started_at
+            results[precision] = matrix
+            self.stdout.write(
+                f'{precision}: {elapsed * 1000:.1f} мс на '
+                f'{matrix.size} пар'
+            )
+
+        error = np.abs(results['fast'] - results['exact'])
+        self.stdout.write(
+            f'Расхождение: максимум {error.max() * 1000:.0f} м, '
+            f'в среднем {error.mean() * 1000:.0f} м'
+        )
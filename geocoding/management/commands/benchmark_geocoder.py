@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from geocoding.utils import UNAVAILABLE, fetch_coordinates_concurrently
+
+
+class Command(BaseCommand):
+    help = 'Измеряет пропускную способность настроенного геокодера'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=100)
+        parser.add_argument('--workers', type=int, default=None)
+        parser.add_argument('--rate-limit', type=float, default=None)
+
+    def handle(self, *args, **options):
+        if options['count'] < 1:
+            raise CommandError('--count должен быть больше нуля')
+
+        addresses = [
+            f'Москва, Тестовая улица, {number}'
+            for number in range(1, options['count'] + 1)
+        ]
+
+        started_at = time.perf_counter()
+        results = fetch_coordinates_concurrently(
+            addresses,
+            max_workers=options['workers'],
+            rate_limit=options['rate_limit'],
+        )
+        elapsed = time.perf_counter() - started_at
+
+        found = sum(
+            1 for coords in results.values()
+            if coords and coords != UNAVAILABLE
+        )
+        unavailable = sum(
+            1 for coords in results.values() if coords == UNAVAILABLE
+        )
+        self.stdout.write(
+            f'Адресов: {len(addresses)}, найдено: {found}, '
+            f'не найдено: {len(addresses) - found - unavailable}, '
+            f'геокодер недоступен: {unavailable}'
+        )
+        throughput = len(addresses) / elapsed if elapsed else float('inf')
+        self.stdout.write(
+            f'Время: {elapsed:.2f} с, '
+            f'{throughput:.1f} адресов в секунду'
+        )
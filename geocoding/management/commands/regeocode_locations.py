@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from geocoding.utils import regeocode_expired_locations
+
+
+class Command(BaseCommand):
+    help = 'Повторно геокодирует ненайденные адреса, у которых истёк срок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Сколько адресов обработать за один запуск',
+        )
+
+    def handle(self, *args, **options):
+        processed, resolved = regeocode_expired_locations(options['limit'])
+        self.stdout.write(
+            f'Обработано адресов: {processed}, найдено: {resolved}'
+        )
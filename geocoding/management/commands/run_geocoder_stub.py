@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from geocoding.stub_server import make_stub_server
+
+
+class Command(BaseCommand):
+    help = 'Запускает локальную заглушку геокодера Яндекса'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8001)
+        parser.add_argument(
+            '--latency',
+            type=float,
+            default=0,
+            help='Задержка ответа в секундах',
+        )
+        parser.add_argument(
+            '--error-rate',
+            type=float,
+            default=0,
+            help='Доля ответов с ошибкой 503, от 0 до 1',
+        )
+        parser.add_argument(
+            '--not-found-rate',
+            type=float,
+            default=0,
+            help='Доля пустых ответов, от 0 до 1',
+        )
+
+    def handle(self, *args, **options):
+        server = make_stub_server(
+            options['host'],
+            options['port'],
+            latency=options['latency'],
+            error_rate=options['error_rate'],
+            not_found_rate=options['not_found_rate'],
+            verbose=options['verbosity'] > 1,
+        )
+        host, port = server.server_address
+        self.stdout.write(f'Заглушка геокодера: http://{host}:{port}/1.x')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
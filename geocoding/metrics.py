@@ -0,0 +1,162 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+
+    def get_label_values(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def format_labels(self, label_values, extra=()):
+        pairs = list(zip(self.labelnames, label_values)) + list(extra)
+        if not pairs:
+            return ''
+        joined = ','.join(f'{name}="{value}"' for name, value in pairs)
+        return f'{{{joined}}}'
+
+    def render(self):
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.kind}',
+        ]
+        lines.extend(self.render_samples())
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self.get_label_values(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(self.get_label_values(labels), 0)
+
+    def render_samples(self):
+        with self.lock:
+            values = sorted(self.values.items())
+        return [
+            f'{self.name}{self.format_labels(key)} {value}'
+            for key, value in values
+        ]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+    default_buckets = (
+        0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+    )
+
+    def __init__(self, *args, buckets=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(buckets or self.default_buckets)
+        self.values = {}
+
+    def observe(self, value, **labels):
+        key = self.get_label_values(labels)
+        with self.lock:
+            sample = self.values.setdefault(key, {
+                'buckets': [0] * len(self.buckets),
+                'sum': 0,
+                'count': 0,
+            })
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    sample['buckets'][index] += 1
+            sample['sum'] += value
+            sample['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started_at, **labels)
+
+    def render_samples(self):
+        with self.lock:
+            values = [
+                (key, dict(sample, buckets=list(sample['buckets'])))
+                for key, sample in sorted(self.values.items())
+            ]
+        lines = []
+        for key, sample in values:
+            for bound, count in zip(self.buckets, sample['buckets']):
+                labels = self.format_labels(key, [('le', bound)])
+                lines.append(f'{self.name}_bucket{labels} {count}')
+            labels = self.format_labels(key, [('le', '+Inf')])
+            lines.append(f'{self.name}_bucket{labels} {sample["count"]}')
+            labels = self.format_labels(key)
+            lines.append(f'{self.name}_sum{labels} {sample["sum"]}')
+            lines.append(f'{self.name}_count{labels} {sample["count"]}')
+        return lines
+
+
+request_stats = threading.local()
+
+
+def start_request_summary():
+    request_stats.summary = {}
+
+
+def finish_request_summary():
+    summary = getattr(request_stats, 'summary', None)
+    request_stats.summary = None
+    return summary or {}
+
+
+def add_to_request_summary(name, amount=1):
+    summary = getattr(request_stats, 'summary', None)
+    if summary is not None:
+        summary[name] = summary.get(name, 0) + amount
+
+
+lookups = Counter(
+    'geocoding_lookups_total',
+    'Адреса, запрошенные у get_or_create_locations, по источнику ответа',
+    labelnames=['result'],
+)
+geocoder_requests = Counter(
+    'geocoding_geocoder_requests_total',
+    'Обращения к внешнему геокодеру по результату, кроме circuit_open расходуют квоту API',
+    labelnames=['outcome'],
+)
+geocoder_latency = Histogram(
+    'geocoding_geocoder_request_seconds',
+    'Длительность одного HTTP-запроса к внешнему геокодеру',
+)
+lookup_latency = Histogram(
+    'geocoding_lookup_seconds',
+    'Длительность вызова get_or_create_locations',
+)
+
+registry = [lookups, geocoder_requests, geocoder_latency, lookup_latency]
+
+
+def record_lookups(result, amount):
+    if not amount:
+        return
+    lookups.inc(amount, result=result)
+    add_to_request_summary(result, amount)
+
+
+def render_metrics():
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
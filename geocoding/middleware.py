@@ -0,0 +1,33 @@
+import logging
+
+from .metrics import finish_request_summary, start_request_summary
+
+
+logger = logging.getLogger(__name__)
+
+
+class GeocodingSummaryMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start_request_summary()
+        response = self.get_response(request)
+        summary = finish_request_summary()
+        if not summary:
+            return response
+
+        seconds = summary.pop('seconds', 0)
+        description = ' '.join(
+            f'{name}={count}' for name, count in sorted(summary.items())
+        )
+        response['Server-Timing'] = (
+            f'geocoding;dur={seconds * 1000:.1f};desc="{description}"'
+        )
+        logger.info(
+            'Геокодирование для %s: %.3f с, %s',
+            request.path,
+            seconds,
+            description,
+        )
+        return response
@@ -0,0 +1,56 @@
+from django.db import migrations, models
+
+from geocoding.normalization import normalize_address
+
+
+def fill_canonical_addresses(apps, schema_editor):
+    Location = apps.get_model('geocoding', 'Location')
+
+    locations_by_canonical = {}
+    for location in Location.objects.order_by('-updated_at'):
+        canonical = normalize_address(location.address)
+        locations_by_canonical.setdefault(canonical, []).append(location)
+
+    duplicate_ids = []
+    for canonical, locations in locations_by_canonical.items():
+        found = [loc for loc in locations if loc.lat is not None]
+        kept = found[0] if found else locations[0]
+        duplicate_ids.extend(loc.id for loc in locations if loc is not kept)
+        kept.canonical_address = canonical
+        kept.save(update_fields=['canonical_address'])
+
+    Location.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geocoding', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='canonical_address',
+            field=models.CharField(
+                editable=False,
+                max_length=255,
+                null=True,
+                verbose_name='нормализованный адрес',
+            ),
+        ),
+        migrations.RunPython(
+            fill_canonical_addresses,
+            migrations.RunPython.noop,
+        ),
+        migrations.AlterField(
+            model_name='location',
+            name='canonical_address',
+            field=models.CharField(
+                editable=False,
+                max_length=255,
+                unique=True,
+                verbose_name='нормализованный адрес',
+            ),
+        ),
+    ]
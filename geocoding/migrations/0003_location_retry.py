@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geocoding', '0002_location_canonical_address'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='failed_attempts',
+            field=models.PositiveIntegerField(default=0, verbose_name='неудачных попыток'),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='retry_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='повторить запрос после'),
+        ),
+    ]
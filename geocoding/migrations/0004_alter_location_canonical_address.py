@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geocoding', '0003_location_retry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='location',
+            name='canonical_address',
+            field=models.TextField(editable=False, unique=True, verbose_name='нормализованный адрес'),
+        ),
+    ]
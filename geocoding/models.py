@@ -1,10 +1,27 @@
 from django.db import models
 
+from .normalization import normalize_address
+
 
 class Location(models.Model):
     address = models.CharField('адрес', max_length=200, unique=True)
+    canonical_address = models.TextField(
+        'нормализованный адрес',
+        unique=True,
+        editable=False,
+    )
     lat = models.FloatField('широта', null=True, blank=True)
     lon = models.FloatField('долгота', null=True, blank=True)
+    failed_attempts = models.PositiveIntegerField(
+        'неудачных попыток',
+        default=0,
+    )
+    retry_at = models.DateTimeField(
+        'повторить запрос после',
+        null=True,
+        blank=True,
+        db_index=True,
+    )
     created_at = models.DateTimeField('запрос создан', auto_now_add=True)
     updated_at = models.DateTimeField('последнее обновление', auto_now=True)
 
@@ -15,6 +32,10 @@ class Location(models.Model):
     def __str__(self):
         return f'{self.address} ({self.lat} {self.lon})'
 
+    def save(self, *args, **kwargs):
+        self.canonical_address = normalize_address(self.address)
+        super().save(*args, **kwargs)
+
     @property
     def coordinates(self):
         if self.lat is not None and self.lon is not None:
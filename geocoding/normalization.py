@@ -0,0 +1,67 @@
+import re
+
+
+ABBREVIATIONS = {
+    'ул': 'улица',
+    'пр': 'проспект',
+    'пр-т': 'проспект',
+    'пр-кт': 'проспект',
+    'просп': 'проспект',
+    'пер': 'переулок',
+    'пл': 'площадь',
+    'б-р': 'бульвар',
+    'бул': 'бульвар',
+    'ш': 'шоссе',
+    'наб': 'набережная',
+    'мкр': 'микрорайон',
+    'мкрн': 'микрорайон',
+    'г': 'город',
+    'д': 'дом',
+    'к': 'корпус',
+    'корп': 'корпус',
+    'стр': 'строение',
+    'кв': 'квартира',
+    'обл': 'область',
+    'р-н': 'район',
+}
+
+STREET_TYPES = {
+    'улица',
+    'проспект',
+    'переулок',
+    'площадь',
+    'бульвар',
+    'шоссе',
+    'набережная',
+    'микрорайон',
+}
+
+NOISE_WORDS = {
+    'город',
+    'дом',
+}
+
+TOKEN_PATTERN = re.compile(r'\w+(?:[-/]\w+)*')
+GLUED_NUMBER_PATTERN = re.compile(r'\b(д|к|корп|стр|кв)(\d)')
+
+
+def normalize_address(address):
+    if not address:
+        return ''
+
+    address = address.lower().replace('ё', 'е')
+    address = GLUED_NUMBER_PATTERN.sub(r'\1 \2', address)
+    tokens = TOKEN_PATTERN.findall(address)
+
+    words = []
+    street_types = []
+    for token in tokens:
+        token = ABBREVIATIONS.get(token, token)
+        if token in NOISE_WORDS:
+            continue
+        if token in STREET_TYPES:
+            street_types.append(token)
+        else:
+            words.append(token)
+
+    return ' '.join(words + sorted(street_types)) or address.strip()
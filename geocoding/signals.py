@@ -0,0 +1,11 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Location
+from .utils import location_lru
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def invalidate_location_cache(sender, instance, **kwargs):
+    location_lru.invalidate(instance.canonical_address)
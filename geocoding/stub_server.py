@@ -0,0 +1,71 @@
+import hashlib
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+MOSCOW_BBOX = (55.55, 37.35, 55.95, 37.85)
+
+
+def get_fake_coordinates(address):
+    digest = hashlib.md5(address.encode('utf-8')).digest()
+    min_lat, min_lon, max_lat, max_lon = MOSCOW_BBOX
+    lat = min_lat + (max_lat - min_lat) * digest[0] / 255
+    lon = min_lon + (max_lon - min_lon) * digest[1] / 255
+    return round(lat, 6), round(lon, 6)
+
+
+class StubGeocoderHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        address = query.get('geocode', [''])[0]
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        if random.random() < self.server.error_rate:
+            self.send_json({'message': 'Service unavailable'}, status=503)
+            return
+
+        found_places = []
+        if address and random.random() >= self.server.not_found_rate:
+            lat, lon = get_fake_coordinates(address)
+            found_places.append({
+                'GeoObject': {
+                    'name': address,
+                    'Point': {'pos': f'{lon} {lat}'},
+                }
+            })
+
+        self.send_json({
+            'response': {
+                'GeoObjectCollection': {
+                    'featureMember': found_places,
+                }
+            }
+        })
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_stub_server(host, port, latency=0, error_rate=0, not_found_rate=0,
+                     verbose=False):
+    server = ThreadingHTTPServer((host, port), StubGeocoderHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.error_rate = error_rate
+    server.not_found_rate = not_found_rate
+    server.verbose = verbose
+    return server
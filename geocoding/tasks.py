@@ -0,0 +1,50 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.GEOCODER_BACKGROUND_WORKERS,
+    thread_name_prefix='geocoding',
+)
+pending_keys = set()
+running_keys = set()
+dirty_keys = set()
+pending_lock = threading.Lock()
+
+
+def run_in_background(func, *args, key=None):
+    if key is not None:
+        with pending_lock:
+            if key in pending_keys:
+                return None
+            if key in running_keys:
+                dirty_keys.add(key)
+                return None
+            pending_keys.add(key)
+
+    def run():
+        if key is not None:
+            with pending_lock:
+                pending_keys.discard(key)
+                running_keys.add(key)
+        try:
+            func(*args)
+        except Exception:
+            logger.exception('Фоновая задача геокодирования упала')
+        finally:
+            connections.close_all()
+            if key is not None:
+                with pending_lock:
+                    running_keys.discard(key)
+                    rerun = key in dirty_keys
+                    dirty_keys.discard(key)
+                if rerun:
+                    run_in_background(func, *args, key=key)
+
+    return executor.submit(run)
@@ -1,3 +1,333 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from . import metrics, tasks
+from .backends import CircuitBreaker, GeocoderUnavailable, YandexGeocoder
+from .models import Location
+from .normalization import normalize_address
+from .utils import GeocodingLeases, geocoding_leases
+from .utils import get_or_create_locations, location_lru
+from .utils import regeocode_expired_locations
+
+
+class RunInBackgroundTest(SimpleTestCase):
+    def test_key_requested_while_running_reruns_once(self):
+        started = threading.Event()
+        release = threading.Event()
+        finished = threading.Semaphore(0)
+        calls = []
+
+        def job(value):
+            calls.append(value)
+            started.set()
+            release.wait(5)
+            finished.release()
+
+        tasks.run_in_background(job, 1, key='rerun-test')
+        started.wait(5)
+        tasks.run_in_background(job, 1, key='rerun-test')
+        tasks.run_in_background(job, 1, key='rerun-test')
+        release.set()
+
+        self.assertTrue(finished.acquire(timeout=5))
+        self.assertTrue(finished.acquire(timeout=5))
+        self.assertEqual(calls, [1, 1])
+        self.assertFalse(finished.acquire(timeout=0.2))
+
+
+@mock.patch(
+    'geocoding.utils.fetch_coordinates',
+    side_effect=GeocoderUnavailable,
+)
+class GeocoderOutageTest(TestCase):
+    def setUp(self):
+        location_lru.clear()
+
+    def test_outage_is_not_stored_as_not_found(self, fetch_coordinates):
+        address = 'Москва, Недоступная улица, 1'
+        coordinates = get_or_create_locations([address])
+
+        self.assertEqual(coordinates, {address: None})
+        self.assertFalse(Location.objects.exists())
+        self.assertEqual(location_lru.entries, {})
+
+    def test_outage_keeps_retry_schedule(self, fetch_coordinates):
+        retry_at = timezone.now() - timedelta(minutes=1)
+        location = Location.objects.create(
+            address='Москва, Недоступная улица, 2',
+            failed_attempts=2,
+            retry_at=retry_at,
+        )
+
+        self.assertEqual(regeocode_expired_locations(), (0, 0))
+        location.refresh_from_db()
+        self.assertEqual(location.failed_attempts, 2)
+        self.assertEqual(location.retry_at, retry_at)
+
+
+class CanonicalAddressTest(TestCase):
+    def setUp(self):
+        location_lru.clear()
+
+    @mock.patch(
+        'geocoding.utils.fetch_coordinates',
+        return_value=(55.75, 37.62),
+    )
+    def test_long_abbreviated_address(self, fetch_coordinates):
+        address = ('ул ' * 67)[:200]
+        self.assertGreater(len(normalize_address(address)), 255)
+
+        coordinates = get_or_create_locations([address])
+
+        self.assertEqual(coordinates, {address: (55.75, 37.62)})
+        self.assertTrue(Location.objects.filter(address=address).exists())
+
+
+class NormalizeAddressTest(SimpleTestCase):
+    def test_spelling_variants_collapse(self):
+        self.assertEqual(
+            {
+                normalize_address('ул. Ленина, 5'),
+                normalize_address('улица Ленина 5'),
+                normalize_address('  Ленина ул 5 '),
+            },
+            {'ленина 5 улица'}
+        )
+
+    def test_street_types_are_kept_apart(self):
+        self.assertNotEqual(
+            normalize_address('ул. Ленина, 5'),
+            normalize_address('пр. Ленина, 5')
+        )
+
+    def test_glued_building_is_kept_apart(self):
+        self.assertNotEqual(
+            normalize_address('ул. Ленина, 5к2'),
+            normalize_address('ул. Ленина, 5 к 2')
+        )
+
+
+class CanonicalAddressMigrationTest(TransactionTestCase):
+    migrate_from = [('geocoding', '0001_initial')]
+    migrate_to = [('geocoding', '0002_location_canonical_address')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_duplicates_merge_into_newest_found_location(self):
+        apps = self.migrate(self.migrate_from)
+        OldLocation = apps.get_model('geocoding', 'Location')
+        now = timezone.now()
+        rows = [
+            ('ул. Ленина, 5', (55.1, 37.1), now - timedelta(days=2)),
+            ('улица Ленина 5', (55.2, 37.2), now - timedelta(days=1)),
+            ('Ленина ул 5', (None, None), now),
+            ('пр. Ленина, 5', (None, None), now),
+        ]
+        for address, (lat, lon), updated_at in rows:
+            location = OldLocation.objects.create(
+                address=address,
+                lat=lat,
+                lon=lon,
+            )
+            OldLocation.objects.filter(pk=location.pk).update(
+                updated_at=updated_at
+            )
+
+        apps = self.migrate(self.migrate_to)
+        NewLocation = apps.get_model('geocoding', 'Location')
+
+        self.assertQuerySetEqual(
+            NewLocation.objects.order_by('canonical_address').values_list(
+                'address', 'canonical_address'
+            ),
+            [
+                ('пр. Ленина, 5', 'ленина 5 проспект'),
+                ('улица Ленина 5', 'ленина 5 улица'),
+            ]
+        )
+
+
+class GeocodingLeasesTest(TransactionTestCase):
+    def setUp(self):
+        geocoding_leases.cache.clear()
+        location_lru.clear()
+
+    def test_acquire_and_release(self):
+        leases = GeocodingLeases('default', timeout=30, wait_timeout=0)
+
+        self.assertEqual(leases.acquire(['а', 'б']), (['а', 'б'], []))
+        self.assertEqual(leases.acquire(['а', 'в']), (['в'], ['а']))
+        leases.release(['а'])
+        self.assertEqual(leases.acquire(['а']), (['а'], []))
+
+    def test_wait_for_gives_up_after_timeout(self):
+        leases = GeocodingLeases('default', timeout=30, wait_timeout=0.05)
+        leases.poll_interval = 0.01
+        read_locations = mock.Mock(return_value={})
+
+        self.assertEqual(leases.wait_for(['а'], read_locations), {})
+        read_locations.assert_called_with(['а'])
+
+    def test_second_caller_reads_first_callers_location(self):
+        address = 'Москва, Общая улица, 1'
+        fetch_started = threading.Event()
+        release_fetch = threading.Event()
+        first_result = {}
+
+        def fetch_coordinates(address):
+            fetch_started.set()
+            release_fetch.wait(5)
+            return (55.75, 37.62)
+
+        def first_caller():
+            try:
+                first_result.update(get_or_create_locations([address]))
+            finally:
+                connections.close_all()
+
+        coalesced = metrics.lookups.get(result='coalesced')
+        with (
+            mock.patch(
+                'geocoding.utils.fetch_coordinates',
+                side_effect=fetch_coordinates,
+            ) as fetch,
+            mock.patch.object(geocoding_leases, 'poll_interval', 0.01),
+            mock.patch.object(geocoding_leases, 'wait_timeout', 5),
+        ):
+            thread = threading.Thread(target=first_caller)
+            thread.start()
+            self.assertTrue(fetch_started.wait(5))
+            threading.Timer(0.05, release_fetch.set).start()
+
+            second_result = get_or_create_locations([address])
+            thread.join(5)
+
+        fetch.assert_called_once_with(address)
+        self.assertEqual(first_result, {address: (55.75, 37.62)})
+        self.assertEqual(second_result, {address: (55.75, 37.62)})
+        self.assertEqual(
+            metrics.lookups.get(result='coalesced'),
+            coalesced + 1
+        )
+
+    def test_second_caller_gives_up_on_stuck_lease(self):
+        address = 'Москва, Общая улица, 2'
+        geocoding_leases.acquire([normalize_address(address)])
+
+        timeouts = metrics.lookups.get(result='coalesce_timeout')
+        with (
+            mock.patch('geocoding.utils.fetch_coordinates') as fetch,
+            mock.patch.object(geocoding_leases, 'poll_interval', 0.01),
+            mock.patch.object(geocoding_leases, 'wait_timeout', 0.05),
+        ):
+            result = get_or_create_locations([address])
+
+        fetch.assert_not_called()
+        self.assertEqual(result, {address: None})
+        self.assertEqual(
+            metrics.lookups.get(result='coalesce_timeout'),
+            timeouts + 1
+        )
+
+
+def make_response(status_code, coords=None):
+    members = []
+    if coords:
+        lat, lon = coords
+        members.append({'GeoObject': {'Point': {'pos': f'{lon} {lat}'}}})
+    response = mock.Mock(status_code=status_code, ok=status_code < 400)
+    response.json.return_value = {
+        'response': {'GeoObjectCollection': {'featureMember': members}}
+    }
+    return response
+
+
+class CircuitBreakerTest(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch(
+            'geocoding.backends.time.monotonic',
+            side_effect=lambda: self.now,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+
+    def test_opens_after_threshold(self):
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow_request())
+
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_half_open_probe(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+
+        self.now += 30
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+
+        self.breaker.record_success()
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_open_breaker_fails_fast(self):
+        geocoder = YandexGeocoder(api_key='key', retries=0, backoff=0)
+        geocoder.breaker = self.breaker
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+
+        with mock.patch.object(geocoder.session, 'get') as get:
+            with self.assertRaises(GeocoderUnavailable):
+                geocoder.geocode('Москва, Красная площадь, 1')
+        get.assert_not_called()
+
+
+class YandexGeocoderRetryTest(SimpleTestCase):
+    def setUp(self):
+        self.geocoder = YandexGeocoder(api_key='key', retries=2, backoff=0)
+
+    def geocode(self, *responses):
+        with mock.patch.object(
+            self.geocoder.session,
+            'get',
+            side_effect=responses,
+        ) as get:
+            try:
+                return self.geocoder.geocode('Москва, Красная площадь, 1')
+            finally:
+                self.calls = get.call_count
+
+    def test_server_errors_are_retried(self):
+        coords = self.geocode(
+            make_response(503),
+            make_response(500),
+            make_response(200, (55.75, 37.62)),
+        )
+
+        self.assertEqual(coords, (55.75, 37.62))
+        self.assertEqual(self.calls, 3)
+
+    def test_rate_limit_is_retried_until_exhausted(self):
+        with self.assertRaises(GeocoderUnavailable):
+            self.geocode(*[make_response(429)] * 3)
+        self.assertEqual(self.calls, 3)
+        self.assertEqual(self.geocoder.breaker.failures, 1)
+
+    def test_client_errors_are_not_retried(self):
+        with self.assertRaises(GeocoderUnavailable):
+            self.geocode(make_response(403), make_response(200))
+        self.assertEqual(self.calls, 1)
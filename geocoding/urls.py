@@ -0,0 +1,10 @@
+from django.urls import path
+
+from .views import metrics_view
+
+
+app_name = "geocoding"
+
+urlpatterns = [
+    path('metrics/', metrics_view, name='metrics'),
+]
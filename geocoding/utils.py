@@ -1,90 +1,405 @@
-import requests
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
 from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q
+from django.dispatch import Signal
+from django.utils import timezone
 
+from . import metrics
+from .backends import GeocoderUnavailable, get_geocoder
 from .models import Location
+from .normalization import normalize_address
+
+
+UNAVAILABLE = 'UNAVAILABLE'
+
+locations_resolved = Signal()
 
 
 def get_or_create_locations(addresses):
+    started_at = time.perf_counter()
+    try:
+        return find_or_geocode_locations(addresses)
+    finally:
+        elapsed = time.perf_counter() - started_at
+        metrics.lookup_latency.observe(elapsed)
+        metrics.add_to_request_summary('seconds', elapsed)
+
+
+def find_or_geocode_locations(addresses):
     if not addresses:
         return {}
 
-    unique_addresses = list(
-        set(addr.strip() for addr in addresses if addr.strip())
-    )
-    if not unique_addresses:
+    raw_by_canonical = {}
+    for addr in addresses:
+        if addr.strip():
+            raw_by_canonical.setdefault(
+                normalize_address(addr),
+                addr.strip()
+            )
+    if not raw_by_canonical:
         return {addr: None for addr in addresses}
 
-    existing_locations = Location.objects.filter(address__in=unique_addresses)
-    location_cache = {}
+    unique_canonicals = list(raw_by_canonical)
+    location_cache = location_lru.get_many(unique_canonicals)
+    record_found('cache_hit', location_cache)
 
-    for loc in existing_locations:
-        if loc.lat is None and loc.lon is None:
-            location_cache[loc.address] = 'NOT_FOUND'
-        else:
-            location_cache[loc.address] = (loc.lat, loc.lon)
+    not_cached = [
+        canonical for canonical in unique_canonicals
+        if canonical not in location_cache
+    ]
+    if not_cached:
+        found = read_locations(not_cached)
+        record_found('db_hit', found)
+        location_cache.update(found)
+        location_lru.set_many(found)
 
-    missing_addresses = [
-        addr for addr in unique_addresses
-        if addr not in location_cache
+    missing_canonicals = [
+        canonical for canonical in unique_canonicals
+        if canonical not in location_cache
     ]
+    missing_canonicals, leased_elsewhere = geocoding_leases.acquire(
+        missing_canonicals
+    )
+    metrics.record_lookups('miss', len(missing_canonicals))
 
-    if missing_addresses:
-        new_locations = []
-        for address in missing_addresses:
-            coords = fetch_coordinates_from_yandex(address)
-            if coords is None:
-                location_cache[address] = 'NOT_FOUND'
-                new_locations.append(
-                    Location(address=address, lat=None, lon=None)
-                )
-            else:
-                location_cache[address] = coords
-                new_locations.append(
-                    Location(
-                        address=address,
-                        lat=coords[0] if coords else None,
-                        lon=coords[1] if coords else None
+    if missing_canonicals:
+        try:
+            now = timezone.now()
+            new_locations = []
+            fetched = fetch_coordinates_concurrently([
+                raw_by_canonical[canonical]
+                for canonical in missing_canonicals
+            ])
+            unavailable = 0
+            for canonical in missing_canonicals:
+                address = raw_by_canonical[canonical]
+                coords = fetched.get(address)
+                if coords == UNAVAILABLE:
+                    unavailable += 1
+                elif coords is None:
+                    location_cache[canonical] = 'NOT_FOUND'
+                    new_locations.append(
+                        Location(
+                            address=address,
+                            canonical_address=canonical,
+                            lat=None,
+                            lon=None,
+                            failed_attempts=1,
+                            retry_at=get_retry_at(1, now)
+                        )
                     )
+                else:
+                    location_cache[canonical] = coords
+                    new_locations.append(
+                        Location(
+                            address=address,
+                            canonical_address=canonical,
+                            lat=coords[0] if coords else None,
+                            lon=coords[1] if coords else None
+                        )
+                    )
+
+            metrics.record_lookups('unavailable', unavailable)
+
+            if new_locations:
+                Location.objects.bulk_create(
+                    new_locations,
+                    ignore_conflicts=True
                 )
+                location_lru.set_many({
+                    location.canonical_address:
+                        location_cache[location.canonical_address]
+                    for location in new_locations
+                })
+        finally:
+            geocoding_leases.release(missing_canonicals)
 
-        if new_locations:
-            Location.objects.bulk_create(new_locations, ignore_conflicts=True)
+    if leased_elsewhere:
+        found = geocoding_leases.wait_for(leased_elsewhere, read_locations)
+        metrics.record_lookups('coalesced', len(found))
+        metrics.record_lookups(
+            'coalesce_timeout',
+            len(leased_elsewhere) - len(found)
+        )
+        location_cache.update(found)
+        location_lru.set_many(found)
 
     return {
-        addr: location_cache.get(
-            addr.strip(),
-            'NOT_FOUND'
-        ) for addr in addresses
+        addr: location_cache.get(normalize_address(addr))
+        for addr in addresses
     }
 
 
-def fetch_coordinates_from_yandex(address):
-    try:
-        base_url = "https://geocode-maps.yandex.ru/1.x"
-        response = requests.get(
-            base_url,
-            params={
-                "geocode": address,
-                "apikey": settings.YANDEX_API_KEY,
-                "format": "json",
-            },
-            timeout=10
-        )
-        response.raise_for_status()
-        found_places = (
-            response.json()
-            ['response']
-            ['GeoObjectCollection']
-            ['featureMember']
+def record_found(result, found):
+    negative = sum(1 for coords in found.values() if coords == 'NOT_FOUND')
+    metrics.record_lookups('negative_hit', negative)
+    metrics.record_lookups(result, len(found) - negative)
+
+
+def read_locations(canonical_addresses):
+    existing_locations = Location.objects.filter(
+        canonical_address__in=canonical_addresses
+    )
+    found = {}
+    for loc in existing_locations:
+        if loc.lat is None and loc.lon is None:
+            found[loc.canonical_address] = 'NOT_FOUND'
+        else:
+            found[loc.canonical_address] = (loc.lat, loc.lon)
+    return found
+
+
+def get_retry_at(failed_attempts, now=None):
+    if now is None:
+        now = timezone.now()
+    delay = settings.GEOCODER_NOT_FOUND_TTL * 2 ** max(failed_attempts - 1, 0)
+    delay = min(delay, settings.GEOCODER_NOT_FOUND_MAX_TTL)
+    return now + timedelta(seconds=delay)
+
+
+def regeocode_expired_locations(limit=None):
+    now = timezone.now()
+    expired_locations = (
+        Location.objects
+        .filter(lat__isnull=True, lon__isnull=True)
+        .filter(Q(retry_at__isnull=True) | Q(retry_at__lte=now))
+        .order_by('retry_at')
+    )
+    if limit:
+        expired_locations = expired_locations[:limit]
+    expired_locations = list(expired_locations)
+
+    fetched = fetch_coordinates_concurrently(
+        [loc.address for loc in expired_locations]
+    )
+
+    checked_locations = []
+    resolved_ids = []
+    for loc in expired_locations:
+        coords = fetched.get(loc.address)
+        if coords == UNAVAILABLE:
+            continue
+        checked_locations.append(loc)
+        if coords is None:
+            loc.failed_attempts += 1
+            loc.retry_at = get_retry_at(loc.failed_attempts, now)
+        else:
+            loc.lat, loc.lon = coords
+            loc.failed_attempts = 0
+            loc.retry_at = None
+            resolved_ids.append(loc.id)
+        loc.updated_at = now
+
+    Location.objects.bulk_update(
+        checked_locations,
+        ['lat', 'lon', 'failed_attempts', 'retry_at', 'updated_at'],
+    )
+    for loc in checked_locations:
+        location_lru.invalidate(loc.canonical_address)
+    if resolved_ids:
+        locations_resolved.send(
+            sender=Location,
+            location_ids=resolved_ids
         )
-        if not found_places:
+
+    return len(checked_locations), len(resolved_ids)
+
+
+class LocationCache:
+    key_prefix = 'geocoding:location:'
+
+    def __init__(self, max_size, ttl, shared_cache_alias=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared_cache_alias = shared_cache_alias
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @property
+    def shared_cache(self):
+        if not self.shared_cache_alias:
             return None
+        return caches[self.shared_cache_alias]
+
+    def make_key(self, canonical_address):
+        digest = hashlib.md5(canonical_address.encode('utf-8')).hexdigest()
+        return f'{self.key_prefix}{digest}'
+
+    def get_many(self, addresses):
+        found = {}
+        now = time.monotonic()
+        with self.lock:
+            for address in addresses:
+                entry = self.entries.get(address)
+                if entry is None:
+                    continue
+                value, expires_at = entry
+                if expires_at < now:
+                    del self.entries[address]
+                    continue
+                self.entries.move_to_end(address)
+                found[address] = value
+
+        shared_cache = self.shared_cache
+        missing = [address for address in addresses if address not in found]
+        if shared_cache is not None and missing:
+            keys = {self.make_key(address): address for address in missing}
+            shared_found = {
+                keys[key]: value
+                for key, value in shared_cache.get_many(keys).items()
+            }
+            self._remember(shared_found)
+            found.update(shared_found)
+
+        return found
+
+    def set_many(self, locations):
+        if not locations:
+            return
+        self._remember(locations)
+        shared_cache = self.shared_cache
+        if shared_cache is not None:
+            shared_cache.set_many(
+                {
+                    self.make_key(address): value
+                    for address, value in locations.items()
+                },
+                timeout=self.ttl,
+            )
+
+    def invalidate(self, address):
+        with self.lock:
+            self.entries.pop(address, None)
+        shared_cache = self.shared_cache
+        if shared_cache is not None:
+            shared_cache.delete(self.make_key(address))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def _remember(self, locations):
+        if not self.max_size:
+            return
+        expires_at = time.monotonic() + self.ttl
+        with self.lock:
+            for address, value in locations.items():
+                self.entries[address] = (value, expires_at)
+                self.entries.move_to_end(address)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+
+location_lru = LocationCache(
+    max_size=settings.GEOCODER_CACHE_SIZE,
+    ttl=settings.GEOCODER_CACHE_TTL,
+    shared_cache_alias=settings.GEOCODER_SHARED_CACHE,
+)
+
+
+class GeocodingLeases:
+    key_prefix = 'geocoding:lease:'
+    poll_interval = 0.1
+
+    def __init__(self, cache_alias, timeout, wait_timeout):
+        self.cache_alias = cache_alias
+        self.timeout = timeout
+        self.wait_timeout = wait_timeout
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def make_key(self, canonical_address):
+        digest = hashlib.md5(canonical_address.encode('utf-8')).hexdigest()
+        return f'{self.key_prefix}{digest}'
+
+    def acquire(self, canonical_addresses):
+        acquired, leased_elsewhere = [], []
+        for canonical in canonical_addresses:
+            if self.cache.add(self.make_key(canonical), 1, self.timeout):
+                acquired.append(canonical)
+            else:
+                leased_elsewhere.append(canonical)
+        return acquired, leased_elsewhere
+
+    def release(self, canonical_addresses):
+        self.cache.delete_many(
+            [self.make_key(canonical) for canonical in canonical_addresses]
+        )
+
+    def wait_for(self, canonical_addresses, read_locations):
+        found = {}
+        pending = list(canonical_addresses)
+        deadline = time.monotonic() + self.wait_timeout
+        while pending and time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            found.update(read_locations(pending))
+            pending = [
+                canonical for canonical in pending
+                if canonical not in found
+            ]
+        return found
+
+
+geocoding_leases = GeocodingLeases(
+    cache_alias=settings.GEOCODER_SHARED_CACHE or 'default',
+    timeout=settings.GEOCODER_LEASE_TIMEOUT,
+    wait_timeout=settings.GEOCODER_LEASE_WAIT,
+)
+
+
+class RateLimiter:
+    def __init__(self, rate_per_second):
+        self.interval = 1 / rate_per_second if rate_per_second else 0
+        self.next_call_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            call_at = max(now, self.next_call_at)
+            self.next_call_at = call_at + self.interval
+        delay = call_at - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+def fetch_coordinates_concurrently(addresses, max_workers=None,
+                                   rate_limit=None):
+    if not addresses:
+        return {}
+
+    if max_workers is None:
+        max_workers = settings.GEOCODER_MAX_WORKERS
+    if rate_limit is None:
+        rate_limit = settings.GEOCODER_RATE_LIMIT
+
+    rate_limiter = RateLimiter(rate_limit)
+
+    def fetch(address):
+        rate_limiter.wait()
+        try:
+            return fetch_coordinates(address)
+        except GeocoderUnavailable:
+            return UNAVAILABLE
+
+    workers = max(1, min(max_workers, len(addresses)))
+    if workers == 1:
+        return {address: fetch(address) for address in addresses}
 
-        most_relevant = found_places[0]
-        lon, lat = most_relevant['GeoObject']['Point']['pos'].split(" ")
-        lat, lon = float(lat), float(lon)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(addresses, executor.map(fetch, addresses)))
 
-        return (lat, lon)
 
-    except (requests.RequestException, KeyError, ValueError, TypeError):
-        return None
+def fetch_coordinates(address):
+    return get_geocoder().geocode(address)
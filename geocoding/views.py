@@ -1,3 +1,17 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
 
-# Create your views here.
+from .metrics import render_metrics
+
+
+def metrics_view(request):
+    token = settings.GEOCODER_METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    has_token = bool(token) and authorization == f'Bearer {token}'
+    if not has_token and not request.user.is_staff:
+        return HttpResponseForbidden()
+
+    return HttpResponse(
+        render_metrics(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
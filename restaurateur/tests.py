@@ -1,3 +1,133 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.test import override_settings
+from django.utils import timezone
+
+from foodcartapp.models import Order
+from foodcartapp.tests import QueryBudgetTestCase
+
+
+class ManagerViewsQueryBudgetTest(QueryBudgetTestCase):
+    def setUp(self):
+        self.client.force_login(self.manager)
+
+    def test_view_orders(self):
+        with self.assertQueryBudget(4):
+            response = self.client.get('/manager/orders/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_view_order_changes(self):
+        Order.objects.update(changed_at=timezone.now() - timedelta(hours=1))
+        response = self.client.get('/manager/orders/')
+        since = response.context['changes_cursor']
+        completed_order, late_order = self.dataset['orders'][:2]
+        Order.objects.filter(pk=completed_order.pk).update(
+            status=Order.Status.COMPLETED,
+            changed_at=timezone.now(),
+        )
+        Order.objects.filter(pk=late_order.pk).update(
+            restaurant=self.dataset['restaurants'][1],
+            changed_at=timezone.now() - timedelta(seconds=5),
+        )
+
+        with self.assertQueryBudget(5):
+            response = self.client.get(
+                '/manager/orders/changes/',
+                {'since': since},
+            )
+        self.assertEqual(response.status_code, 200)
+        changes = response.json()['changes']
+        self.assertEqual(
+            [(change['id'], change['section']) for change in changes],
+            [(late_order.id, 'assigned'), (completed_order.id, None)],
+        )
+
+    def test_view_products(self):
+        with self.assertQueryBudget(5):
+            response = self.client.get('/manager/products/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_view_restaurants(self):
+        with self.assertQueryBudget(3):
+            response = self.client.get('/manager/restaurants/')
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(ORDER_BOARD_PAGE_SIZE=7)
+class OrderBoardTest(QueryBudgetTestCase):
+    def setUp(self):
+        self.client.force_login(self.manager)
+
+    def get_order_ids(self, response):
+        return [
+            order.id
+            for section in ['unassigned_orders', 'assigned_orders']
+            for order in response.context[section]
+        ]
+
+    def test_completed_orders_are_hidden_by_default(self):
+        completed_order = self.dataset['orders'][0]
+        Order.objects.filter(pk=completed_order.pk).update(
+            status=Order.Status.COMPLETED
+        )
+
+        with self.settings(ORDER_BOARD_PAGE_SIZE=100):
+            response = self.client.get('/manager/orders/')
+            self.assertNotIn(completed_order.id, self.get_order_ids(response))
+
+            response = self.client.get(
+                '/manager/orders/',
+                {'status': Order.Status.COMPLETED},
+            )
+            self.assertEqual(
+                self.get_order_ids(response),
+                [completed_order.id]
+            )
+
+    def test_pages_with_equal_created_at(self):
+        Order.objects.update(created_at=timezone.now())
+
+        seen_ids = []
+        query = ''
+        while query is not None:
+            response = self.client.get(f'/manager/orders/?{query}')
+            page_ids = self.get_order_ids(response)
+            self.assertLessEqual(len(page_ids), 7)
+            seen_ids.extend(page_ids)
+            query = response.context['next_page_query']
+
+        self.assertEqual(len(seen_ids), len(set(seen_ids)))
+        self.assertEqual(
+            sorted(seen_ids),
+            sorted(order.id for order in self.dataset['orders'])
+        )
+
+    def test_invalid_cursor_shows_first_page(self):
+        first_page = self.client.get('/manager/orders/')
+
+        response = self.client.get(
+            '/manager/orders/',
+            {'cursor': 'не курсор'},
+        )
+
+        self.assertTrue(response.context['is_first_page'])
+        self.assertEqual(
+            self.get_order_ids(response),
+            self.get_order_ids(first_page)
+        )
+
+    def test_date_filters(self):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        Order.objects.filter(pk=self.dataset['orders'][0].pk).update(
+            created_at=timezone.now() - timedelta(days=1)
+        )
+
+        response = self.client.get(
+            '/manager/orders/',
+            {'date_from': yesterday, 'date_to': yesterday},
+        )
+
+        self.assertEqual(
+            self.get_order_ids(response),
+            [self.dataset['orders'][0].id]
+        )
@@ -1,5 +1,13 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, timedelta
+
 from django import forms
+from django.conf import settings
+from django.db.models import Q
+from django.http import HttpResponseBadRequest, JsonResponse
 from django.shortcuts import redirect, render
+from django.template.loader import render_to_string
+from django.utils import timezone
 from django.views import View
 from django.urls import reverse_lazy
 from django.contrib.auth.decorators import user_passes_test
@@ -57,6 +65,55 @@ class LogoutView(auth_views.LogoutView):
     next_page = reverse_lazy('restaurateur:login')
 
 
+ACTIVE_ORDER_STATUSES = [
+    status for status in Order.Status.values
+    if status != Order.Status.COMPLETED
+]
+
+
+class OrderFilterForm(forms.Form):
+    status = forms.MultipleChoiceField(
+        label='Статус',
+        choices=Order.Status.choices,
+        required=False,
+        widget=forms.CheckboxSelectMultiple,
+    )
+    date_from = forms.DateField(
+        label='Создан с',
+        required=False,
+        widget=forms.DateInput(attrs={
+            'type': 'date',
+            'class': 'form-control',
+        })
+    )
+    date_to = forms.DateField(
+        label='по',
+        required=False,
+        widget=forms.DateInput(attrs={
+            'type': 'date',
+            'class': 'form-control',
+        })
+    )
+    cursor = forms.CharField(required=False, widget=forms.HiddenInput)
+
+
+def encode_cursor(moment, order_id):
+    raw_cursor = f'{moment.isoformat()}|{order_id}'
+    return urlsafe_b64encode(raw_cursor.encode()).decode()
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        raw_created_at, raw_id = (
+            urlsafe_b64decode(cursor.encode()).decode().split('|')
+        )
+        return datetime.fromisoformat(raw_created_at), int(raw_id)
+    except ValueError:
+        return None
+
+
 def is_manager(user):
     return user.is_staff  # FIXME replace with specific permission
 
@@ -64,7 +121,11 @@ def is_manager(user):
 @user_passes_test(is_manager, login_url='restaurateur:login')
 def view_products(request):
     restaurants = list(Restaurant.objects.order_by('name'))
-    products = list(Product.objects.prefetch_related('menu_items'))
+    products = list(
+        Product.objects
+        .select_related('category')
+        .prefetch_related('menu_items')
+    )
 
     products_with_restaurant_availability = []
     for product in products:
@@ -88,20 +149,116 @@ def view_restaurants(request):
     })
 
 
-@user_passes_test(is_manager, login_url='restaurateur:login')
-def view_orders(request):
-    orders = (
-        Order.objects
-        .prefetch_related('items')
+def filter_board_orders(filters):
+    statuses = filters.get('status') or ACTIVE_ORDER_STATUSES
+    orders = Order.objects.filter(status__in=statuses)
+    if filters.get('date_from'):
+        orders = orders.filter(created_at__date__gte=filters['date_from'])
+    if filters.get('date_to'):
+        orders = orders.filter(created_at__date__lte=filters['date_to'])
+    return orders
+
+
+def fetch_board_orders(orders):
+    return list(
+        orders
+        .select_related('location', 'restaurant')
         .with_total_price()
-        .order_by('-created_at')
-        .with_restaurants_and_distances()
+        .with_candidate_restaurants()
     )
 
+
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def view_orders(request):
+    filter_form = OrderFilterForm(request.GET or None)
+    filters = filter_form.cleaned_data if filter_form.is_valid() else {}
+
+    changes_cursor = encode_cursor(timezone.now(), 0)
+    orders = filter_board_orders(filters).order_by('-created_at', '-id')
+
+    cursor = decode_cursor(filters.get('cursor'))
+    if cursor:
+        created_at, order_id = cursor
+        orders = orders.filter(
+            Q(created_at__lt=created_at)
+            | Q(created_at=created_at, id__lt=order_id)
+        )
+
+    page_size = settings.ORDER_BOARD_PAGE_SIZE
+    orders = fetch_board_orders(orders[:page_size + 1])
+    next_cursor = None
+    if len(orders) > page_size:
+        orders = orders[:page_size]
+        next_cursor = encode_cursor(orders[-1].created_at, orders[-1].id)
+
     unassigned_orders = [order for order in orders if not order.restaurant]
     assigned_orders = [order for order in orders if order.restaurant]
 
+    next_page_query = None
+    if next_cursor:
+        query = request.GET.copy()
+        query['cursor'] = next_cursor
+        next_page_query = query.urlencode()
+
+    first_page_query = request.GET.copy()
+    first_page_query.pop('cursor', None)
+
     return render(request, 'order_items.html', {
         'unassigned_orders': unassigned_orders,
-        'assigned_orders': assigned_orders
+        'assigned_orders': assigned_orders,
+        'filter_form': filter_form,
+        'next_page_query': next_page_query,
+        'first_page_query': first_page_query.urlencode(),
+        'is_first_page': cursor is None,
+        'changes_cursor': changes_cursor,
+        'poll_interval': settings.ORDER_BOARD_POLL_INTERVAL,
+    })
+
+
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def view_order_changes(request):
+    since = decode_cursor(request.GET.get('since'))
+    if not since:
+        return HttpResponseBadRequest('Не указан курсор изменений')
+
+    filter_form = OrderFilterForm(request.GET)
+    filters = filter_form.cleaned_data if filter_form.is_valid() else {}
+
+    polled_at = timezone.now()
+    since_changed_at, _ = since
+    overlap = timedelta(seconds=settings.ORDER_BOARD_CHANGES_OVERLAP)
+    changed_ids = list(
+        Order.objects
+        .filter(changed_at__gt=since_changed_at - overlap)
+        .order_by('changed_at', 'id')
+        .values_list('id', flat=True)
+    )
+
+    orders_by_id = {}
+    if changed_ids:
+        orders = fetch_board_orders(
+            filter_board_orders(filters).filter(id__in=changed_ids)
+        )
+        orders_by_id = {order.id: order for order in orders}
+
+    deltas = []
+    for order_id in changed_ids:
+        order = orders_by_id.get(order_id)
+        if not order:
+            deltas.append({'id': order_id, 'section': None, 'html': ''})
+            continue
+        deltas.append({
+            'id': order.id,
+            'section': 'assigned' if order.restaurant else 'unassigned',
+            'changed_at': order.changed_at.isoformat(),
+            'html': render_to_string(
+                'order_row.html',
+                {'item': order},
+                request=request,
+            ),
+        })
+
+    return JsonResponse({
+        'cursor': encode_cursor(polled_at, 0),
+        'changes': deltas,
     })
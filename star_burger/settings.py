@@ -54,6 +54,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
     'rollbar.contrib.django.middleware.RollbarNotifierMiddleware',
+    'geocoding.middleware.GeocodingSummaryMiddleware',
 ]
 
 ROOT_URLCONF = 'star_burger.urls'
@@ -96,6 +97,10 @@ WSGI_APPLICATION = 'star_burger.wsgi.application'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+CACHES = {
+    'default': env.dj_cache_url('CACHE_URL', 'locmem://'),
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -122,7 +127,54 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
-YANDEX_API_KEY = env.str('YANDEX_API_KEY')
+GEOCODER_BACKEND = env.str(
+    'GEOCODER_BACKEND',
+    'geocoding.backends.YandexGeocoder'
+)
+if GEOCODER_BACKEND == 'geocoding.backends.FixtureGeocoder':
+    YANDEX_API_KEY = env.str('YANDEX_API_KEY', '')
+else:
+    YANDEX_API_KEY = env.str('YANDEX_API_KEY')
+GEOCODER_YANDEX_URL = env.str(
+    'GEOCODER_YANDEX_URL',
+    'https://geocode-maps.yandex.ru/1.x'
+)
+GEOCODER_FIXTURE_PATH = env.str('GEOCODER_FIXTURE_PATH', None)
+GEOCODER_TIMEOUT = env.float('GEOCODER_TIMEOUT', 3)
+GEOCODER_RETRIES = env.int('GEOCODER_RETRIES', 2)
+GEOCODER_BACKOFF = env.float('GEOCODER_BACKOFF', 0.3)
+GEOCODER_BREAKER_THRESHOLD = env.int('GEOCODER_BREAKER_THRESHOLD', 5)
+GEOCODER_BREAKER_RESET_TIMEOUT = env.int('GEOCODER_BREAKER_RESET_TIMEOUT', 30)
+GEOCODER_MAX_WORKERS = env.int('GEOCODER_MAX_WORKERS', 5)
+GEOCODER_RATE_LIMIT = env.float('GEOCODER_RATE_LIMIT', 10)
+GEOCODER_CACHE_SIZE = env.int('GEOCODER_CACHE_SIZE', 10000)
+GEOCODER_CACHE_TTL = env.int('GEOCODER_CACHE_TTL', 60 * 60)
+GEOCODER_SHARED_CACHE = env.str('GEOCODER_SHARED_CACHE', None)
+GEOCODER_LEASE_TIMEOUT = env.int('GEOCODER_LEASE_TIMEOUT', 30)
+GEOCODER_LEASE_WAIT = env.float('GEOCODER_LEASE_WAIT', 5)
+MENU_SNAPSHOT_CACHE = env.str('MENU_SNAPSHOT_CACHE', 'default')
+MENU_SNAPSHOT_TTL = env.int('MENU_SNAPSHOT_TTL', 10 * 60)
+CATALOG_CACHE = env.str('CATALOG_CACHE', 'default')
+CATALOG_CACHE_TTL = env.int('CATALOG_CACHE_TTL', 60 * 60)
+PRODUCT_LIST_MAX_PAGE_SIZE = env.int('PRODUCT_LIST_MAX_PAGE_SIZE', 100)
+ORDER_BATCH_MAX_SIZE = env.int('ORDER_BATCH_MAX_SIZE', 500)
+DISTANCE_PRECISION = env.str('DISTANCE_PRECISION', 'fast')
+DELIVERY_DISTANCE_RETENTION_DAYS = env.int(
+    'DELIVERY_DISTANCE_RETENTION_DAYS',
+    90
+)
+ORDER_BOARD_PAGE_SIZE = env.int('ORDER_BOARD_PAGE_SIZE', 50)
+ORDER_BOARD_RESTAURANTS_LIMIT = env.int('ORDER_BOARD_RESTAURANTS_LIMIT', None)
+ORDER_BOARD_MAX_DISTANCE_KM = env.float('ORDER_BOARD_MAX_DISTANCE_KM', None)
+ORDER_BOARD_POLL_INTERVAL = env.int('ORDER_BOARD_POLL_INTERVAL', 5)
+ORDER_BOARD_CHANGES_OVERLAP = env.int('ORDER_BOARD_CHANGES_OVERLAP', 15)
+GEOCODER_METRICS_TOKEN = env.str('GEOCODER_METRICS_TOKEN', None)
+GEOCODER_BACKGROUND_WORKERS = env.int('GEOCODER_BACKGROUND_WORKERS', 2)
+GEOCODER_NOT_FOUND_TTL = env.int('GEOCODER_NOT_FOUND_TTL', 60 * 60)
+GEOCODER_NOT_FOUND_MAX_TTL = env.int(
+    'GEOCODER_NOT_FOUND_MAX_TTL',
+    30 * 24 * 60 * 60
+)
 
 LANGUAGE_CODE = 'ru-RU'
 
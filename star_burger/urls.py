@@ -13,6 +13,7 @@ urlpatterns = [
     path('api/', include('foodcartapp.urls')),
     path('api-auth/', include('rest_framework.urls')),
     path('manager/', include('restaurateur.urls')),
+    path('geocoding/', include('geocoding.urls')),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
 if settings.DEBUG: